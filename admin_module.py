@@ -1,45 +1,9 @@
 import streamlit as st
-from firebase_admin import firestore
-import fitz
-from PIL import Image
-import tempfile
-import uuid
-import os
-
-
-def generate_pdf_preview(bucket, storage_path, is_index=False):
-    try:
-
-        prefix = "index_templates/" if is_index else "pdf_templates/"
-        blob = bucket.blob(f"{prefix}{storage_path}")
-
-        temp_filename = f"{uuid.uuid4()}.pdf"
-        temp_path = os.path.join(tempfile.gettempdir(), temp_filename)
-
-        blob.download_to_filename(temp_path)
-        try:
-            doc = fitz.open(temp_path)
-            if doc.page_count == 0:
-                doc.close()
-                os.unlink(temp_path)
-                return None
-
-            pix = doc[0].get_pixmap(dpi=100)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            doc.close()
-
-            os.unlink(temp_path)
-            return img
-
-        except Exception as e:
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
-            return f"Preview generation failed during rendering: {str(e)}"
-
-    except Exception as e:
-        return f"Preview generation failed: {str(e)}"
+from thumbnail_store import get_thumbnail_store
+from template_metadata import get_template_metadata
+from firestore_batch import delete_templates, reorder_templates
+from template_upload import collect_pdfs, upload_templates, upload_template_file
+import metrics
 
 
 def render_upload_tab(bucket, firestore_db, user_email, document_types, is_index=False):
@@ -48,6 +12,12 @@ def render_upload_tab(bucket, firestore_db, user_email, document_types, is_index
     storage_prefix = "index_templates/" if is_index else "pdf_templates/"
 
     st.subheader(f"Upload New {template_type}")
+    upload_mode = st.radio("Upload Mode", ["Single file", "Bulk (multiple PDFs or zip)"], horizontal=True,
+                           key=f"upload_mode_{'index' if is_index else 'normal'}")
+    if upload_mode != "Single file":
+        render_bulk_upload(bucket, firestore_db, user_email, document_types, is_index=is_index)
+        return
+
     col1, col2 = st.columns(2)
 
     with col1:
@@ -60,6 +30,10 @@ def render_upload_tab(bucket, firestore_db, user_email, document_types, is_index
                                 key=f"template_order_input_{'index' if is_index else 'normal'}")
         uploaded_file = st.file_uploader(f"Choose PDF {template_type}", type=["pdf"],
                                          key=f"template_uploader_{'index' if is_index else 'normal'}")
+        # Index pages are never filled, so only regular templates can be compiled
+        compile_fields = not is_index and st.checkbox(
+            "Compile form fields (faster filling)", value=True, key="template_compile_input_normal"
+        )
 
     with col2:
         if uploaded_file:
@@ -75,19 +49,17 @@ def render_upload_tab(bucket, firestore_db, user_email, document_types, is_index
                     st.warning("Please enter a template name.")
                 else:
                     try:
-
-                        blob = bucket.blob("test_connection.txt")
-                        blob.upload_from_string("connection test", content_type="text/plain")
-                        blob.delete()
-
                         filename = f"template_{order}.pdf"
                         firebase_path = f"{storage_prefix}{doc_type}/{filename}"
-                        blob = bucket.blob(firebase_path)
-
                         with st.spinner(f"Uploading {uploaded_file.name}..."):
-                            blob.upload_from_file(uploaded_file, content_type="application/pdf")
+                            extra, warnings = upload_template_file(bucket, firebase_path, uploaded_file.getvalue(),
+                                                                   is_index, compile_forms=compile_fields)
+                        for warning in warnings:
+                            st.warning(warning[0].upper() + warning[1:])
+
+                        from firebase_admin import firestore
 
-                        firestore_db.collection(collection_name).add({
+                        template_record = {
                             "doc_type": doc_type,
                             "filename": f"{doc_type}/{filename}",
                             "template_name": filename,
@@ -95,7 +67,11 @@ def render_upload_tab(bucket, firestore_db, user_email, document_types, is_index
                             "visible": True,
                             "uploaded_at": firestore.SERVER_TIMESTAMP,
                             "uploaded_by": user_email
-                        })
+                        }
+                        template_record.update(extra)
+
+                        firestore_db.collection(collection_name).add(template_record)
+                        get_template_metadata(firestore_db).invalidate(collection_name, doc_type)
 
                         st.success(f"✅ Successfully uploaded to: {firebase_path}")
                         st.balloons()
@@ -104,6 +80,75 @@ def render_upload_tab(bucket, firestore_db, user_email, document_types, is_index
                         st.error(f"❌ Upload failed: {str(e)}")
 
 
+def render_bulk_upload(bucket, firestore_db, user_email, document_types, is_index=False):
+    template_type = "Index Template" if is_index else "Template"
+    collection_name = "index_templates" if is_index else "templates"
+    storage_prefix = "index_templates/" if is_index else "pdf_templates/"
+    key_suffix = "index" if is_index else "normal"
+
+    doc_type = st.selectbox("Document Type", document_types, key=f"bulk_doc_type_select_{key_suffix}")
+    existing_orders = [data.get("order", 0) for _, data in get_template_metadata(firestore_db).get(collection_name, doc_type)]
+    start_order = st.number_input("First Display Order", min_value=1, step=1,
+                                  value=max(existing_orders, default=0) + 1,
+                                  key=f"bulk_order_input_{key_suffix}")
+    uploaded_files = st.file_uploader(f"Choose PDF {template_type}s or a zip of them", type=["pdf", "zip"],
+                                      accept_multiple_files=True, key=f"bulk_uploader_{key_suffix}")
+    compile_fields = not is_index and st.checkbox("Compile form fields (faster filling)", value=True,
+                                                  key=f"bulk_compile_input_{key_suffix}")
+    st.caption("Files are ordered as selected (zip contents by path) and named after the file. "
+               "Files already stored for this document type are skipped.")
+
+    if not uploaded_files:
+        return
+
+    pdfs, rejected = collect_pdfs(uploaded_files)
+    for item in rejected:
+        st.warning(f"Skipping {item['file']}: {item['reason']}")
+    if not pdfs:
+        return
+
+    st.info(f"{len(pdfs)} PDF{'s' if len(pdfs) != 1 else ''} ready to upload as {doc_type} {template_type.lower()}s")
+    if not st.button(f"✅ Upload {len(pdfs)} {template_type}s", key=f"bulk_upload_button_{key_suffix}"):
+        return
+
+    progress = st.progress(0.0, text="Uploading...")
+    status_lines = st.empty()
+    finished = []
+
+    def on_progress(result):
+        finished.append(result)
+        progress.progress(len(finished) / len(pdfs), text=f"{len(finished)}/{len(pdfs)} files processed")
+        status_lines.markdown("\n".join(
+            f"- {'✅' if r['status'] == 'uploaded' else '⏭️' if r['status'] == 'skipped' else '❌'} "
+            f"**{r['file']}**: {r['status']}{' — ' + r['detail'] if r['detail'] else ''}"
+            for r in finished
+        ))
+
+    try:
+        report = upload_templates(bucket, firestore_db, collection_name, storage_prefix, doc_type, pdfs,
+                                  user_email, int(start_order), is_index=is_index, on_progress=on_progress,
+                                  compile_forms=compile_fields)
+    except Exception as e:
+        st.error(f"❌ Upload failed: {str(e)}")
+        return
+    get_template_metadata(firestore_db).invalidate(collection_name, doc_type)
+    progress.progress(1.0, text="Done")
+
+    if report["error"]:
+        st.error(f"❌ Saving template records failed, uploaded files were removed: {report['error']}")
+    summary = f"Uploaded {report['uploaded']}, skipped {report['skipped']}, failed {report['failed']}."
+    if report["failed"]:
+        st.warning(summary)
+    else:
+        st.success(f"✅ {summary}")
+
+    st.dataframe([
+        {"File": r["file"], "Status": r["status"], "Order": r.get("order", ""),
+         "Path": r.get("blob", ""), "Detail": r["detail"]}
+        for r in report["results"]
+    ], use_container_width=True)
+
+
 def render_template_expander(template_id, template_data, selected_for_delete, firestore_db, bucket, is_index=False):
     collection_name = "index_templates" if is_index else "templates"
     template_type = "Index Template" if is_index else "Template"
@@ -125,11 +170,21 @@ def render_template_expander(template_id, template_data, selected_for_delete, fi
 
             # 🔍 PDF Preview
             st.write("**Preview:**")
-            preview_result = generate_pdf_preview(bucket, template_data.get('filename'), is_index=is_index)
-            if isinstance(preview_result, Image.Image):
-                st.image(preview_result, use_container_width=True)
-            else:
-                st.warning(preview_result)
+            prefix = "index_templates/" if is_index else "pdf_templates/"
+            try:
+                thumbnail = get_thumbnail_store().get(
+                    bucket,
+                    f"{prefix}{template_data.get('filename')}",
+                    template_data,
+                    on_regenerated=lambda fields: firestore_db.collection(collection_name)
+                    .document(template_id).update(fields)
+                )
+                if thumbnail:
+                    st.image(thumbnail, use_container_width=True)
+                else:
+                    st.warning("Template has no pages to preview")
+            except Exception as e:
+                st.warning(f"Preview generation failed: {str(e)}")
 
             # Visibility checkbox
             visibility_key = f"vis_{'index_' if is_index else ''}{template_id}"
@@ -138,6 +193,7 @@ def render_template_expander(template_id, template_data, selected_for_delete, fi
             if new_visibility != current_visibility:
                 try:
                     firestore_db.collection(collection_name).document(template_id).update({"visible": new_visibility})
+                    get_template_metadata(firestore_db).invalidate(collection_name)
                     st.success("Visibility updated!")
                 except Exception as e:
                     st.error(f"Failed to update visibility: {str(e)}")
@@ -148,18 +204,38 @@ def render_template_expander(template_id, template_data, selected_for_delete, fi
                 selected_for_delete.append(template_id)
 
 
-def handle_bulk_delete(selected_ids, firestore_db, is_index=False):
+def _delete_report_key(is_index):
+    return f"delete_report_{'index' if is_index else 'normal'}"
+
+
+def handle_bulk_delete(selected_ids, firestore_db, is_index=False, bucket=None, templates_by_id=None):
     collection_name = "index_templates" if is_index else "templates"
+    storage_prefix = "index_templates/" if is_index else "pdf_templates/"
     template_type = "Index Template" if is_index else "Template"
 
     with st.spinner("Deleting..."):
-        for t_id in selected_ids:
-            try:
-                firestore_db.collection(collection_name).document(t_id).delete()
-            except Exception as e:
-                st.error(f"Failed to delete {template_type.lower()} {t_id}: {str(e)}")
-        st.success(f"Deleted {len(selected_ids)} {template_type.lower()}{'s' if len(selected_ids) != 1 else ''}.")
-        st.rerun()
+        report = delete_templates(firestore_db, bucket, collection_name, storage_prefix,
+                                  templates_by_id or {}, selected_ids)
+        get_template_metadata(firestore_db).invalidate(collection_name)
+
+    if report["error"]:
+        st.error(f"Failed to delete {template_type.lower()}s, nothing was deleted: {report['error']}")
+        return report
+
+    # Shown by render_delete_report after the rerun, which would otherwise wipe it straight away
+    st.session_state[_delete_report_key(is_index)] = dict(report, deleted=len(selected_ids))
+    st.rerun()
+
+
+def render_delete_report(is_index=False):
+    template_type = "index template" if is_index else "template"
+    report = st.session_state.pop(_delete_report_key(is_index), None)
+    if not report:
+        return
+
+    st.success(f"Deleted {report['deleted']} {template_type}{'s' if report['deleted'] != 1 else ''}.")
+    for blob_error in report["blob_errors"]:
+        st.warning(f"Could not delete file {blob_error['blob']}: {blob_error['error']}")
 
 
 def render_template_management_tab(firestore_db, document_types, bucket, is_index=False):
@@ -169,24 +245,22 @@ def render_template_management_tab(firestore_db, document_types, bucket, is_inde
     template_type = "Index Template" if is_index else "Template"
 
     st.subheader(f"Existing {template_type}s")
+    render_delete_report(is_index)
 
     selected_doc_type = st.selectbox(f"Filter by Document Type",
                                      document_types,
                                      key=f"doc_type_filter_{'index' if is_index else 'normal'}")
 
     try:
-        templates = list(firestore_db.collection(collection_name)
-                         .where("doc_type", "==", selected_doc_type)
-                         .stream())
+        templates = get_template_metadata(firestore_db).get(collection_name, selected_doc_type)
 
         valid_templates = []
-        for t in templates:
+        for t_id, t_data in templates:
             try:
-                t_data = t.to_dict()
                 if t_data:
                     t_data['template_name'] = t_data.get('template_name', 'Untitled').encode('utf-8', 'ignore').decode(
                         'utf-8')
-                    valid_templates.append((t.id, t_data))
+                    valid_templates.append((t_id, t_data))
             except Exception as e:
                 st.warning(f"Skipping {template_type.lower()} due to error: {str(e)}")
 
@@ -209,7 +283,8 @@ def render_template_management_tab(firestore_db, document_types, bucket, is_inde
             st.warning(
                 f"{len(selected_for_delete)} {template_type.lower()}{'s' if len(selected_for_delete) != 1 else ''} selected for deletion")
             if st.button(f"⚠️ Confirm Delete Selected {template_type}s"):
-                handle_bulk_delete(selected_for_delete, firestore_db, is_index=is_index)
+                handle_bulk_delete(selected_for_delete, firestore_db, is_index=is_index,
+                                   bucket=bucket, templates_by_id=dict(valid_templates))
 
         st.subheader(f"Reorder {template_type}s")
         st.caption(f"Drag and drop items to reorder within the selected document type")
@@ -231,11 +306,52 @@ def handle_template_reordering(sorted_labels, label_to_id_map, firestore_db, is_
     template_type = "Index Template" if is_index else "Template"
 
     with st.spinner("Updating order..."):
-        for new_order, label in enumerate(sorted_labels, start=1):
-            doc_id = label_to_id_map[label]
-            try:
-                firestore_db.collection(collection_name).document(doc_id).update({"order": new_order})
-            except Exception as e:
-                st.error(f"Failed to update order for {label}: {str(e)}")
+        report = reorder_templates(firestore_db, collection_name, [label_to_id_map[label] for label in sorted_labels])
+        get_template_metadata(firestore_db).invalidate(collection_name)
+
+    if report["error"]:
+        st.error(f"Failed to save {template_type.lower()} order: {report['error']}")
+    else:
         st.success(f"✅ {template_type} order saved!")
+    return report
+
+
+def render_metrics_tab():
+    st.subheader("Pipeline Timings")
+    st.caption("Per-stage latency for this server process, over the most recent "
+               f"{metrics.MAX_SAMPLES} runs of each stage")
+
+    stages = metrics.summary()
+    if not stages:
+        st.info("No timings recorded yet.")
+        return
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    st.dataframe([
+        {
+            "Stage": stage,
+            "Count": values["count"],
+            "Errors": values["errors"],
+            "p50 (ms)": ms(values["p50"]),
+            "p95 (ms)": ms(values["p95"]),
+            "p99 (ms)": ms(values["p99"]),
+            "Total (s)": round(values["sum"], 2)
+        }
+        for stage, values in stages.items()
+    ], use_container_width=True)
+
+    st.subheader("Recent Spans")
+    st.dataframe(list(reversed(metrics.recent_spans(100))), use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("Download Prometheus metrics", data=metrics.to_prometheus(),
+                           file_name="proposal_metrics.prom", mime="text/plain")
+    with col2:
+        st.download_button("Download JSON metrics", data=metrics.to_json(),
+                           file_name="proposal_metrics.json", mime="application/json")
 
+    with st.expander("Prometheus text"):
+        st.code(metrics.to_prometheus(), language="text")
@@ -0,0 +1,187 @@
+import argparse
+import csv
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dateutil import parser as date_parser
+from cross_plat import EditTextFile
+from document_types import DOCUMENT_DEFINITIONS
+from merge_pdf import Merger
+from output_profile import optimize_pdf, OUTPUT_PROFILES, DEFAULT_PROFILE
+
+
+MANIFEST_FIELDS = ["row", "name", "email", "status", "pdf", "docx", "fill_ms", "merge_ms", "optimize_ms",
+                   "bytes_before", "bytes_after", "docx_ms", "total_ms", "error"]
+
+# Per-process template bytes, loaded once by the pool initializer
+_templates = None
+
+
+def _load_templates(page1_path, page1_anchors, index_path, remaining_paths):
+    global _templates
+
+    def read(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    _templates = {
+        "page1": read(page1_path),
+        "anchors": page1_anchors,
+        "index": read(index_path),
+        "remaining": [read(path) for path in remaining_paths]
+    }
+
+
+def _slug(value, default):
+    return re.sub(r"[^A-Za-z0-9]+", "_", value).strip("_")[:40] or default
+
+
+def row_values(document_type, row):
+    # CSV columns are the document type's field keys; dates are parsed from any common format
+    values = {}
+    for key, label, kind in document_type.fields:
+        values[key] = date_parser.parse(row[key]) if kind == "date" else row[key]
+    return values
+
+
+def generate_row(row_number, row, output_dir, with_docx=False, profile=DEFAULT_PROFILE, doc_type="Proposal"):
+    document_type = DOCUMENT_DEFINITIONS[doc_type]
+    result = {field: "" for field in MANIFEST_FIELDS}
+    result.update(row=row_number, name=row.get("name", ""), email=row.get("email", ""))
+    started = time.perf_counter()
+
+    try:
+        modifications = document_type.modifications(row_values(document_type, row))
+
+        step = time.perf_counter()
+        page1 = EditTextFile(_templates["page1"]).modify_pdf_fields(
+            None, modifications, document_type.y_offset, anchors=_templates["anchors"]
+        )
+        if page1 is None:
+            raise RuntimeError("Filling page 1 failed")
+        result["fill_ms"] = round((time.perf_counter() - step) * 1000, 1)
+
+        step = time.perf_counter()
+        merger = Merger([page1, _templates["index"], *_templates["remaining"]])
+        merged = merger.merge_pdf_files()
+        if merged is None or merger.errors:
+            raise RuntimeError(f"Merge failed: {merger.errors}")
+        result["merge_ms"] = round((time.perf_counter() - step) * 1000, 1)
+
+        merged, optimized = optimize_pdf(merged, profile)
+        result["optimize_ms"] = round(optimized["seconds"] * 1000, 1)
+        result["bytes_before"] = optimized["bytes_before"]
+        result["bytes_after"] = optimized["bytes_after"]
+
+        base_name = f"{row_number:04d}_{_slug(row.get('name', ''), document_type.file_stem)}"
+        pdf_path = os.path.join(output_dir, f"{base_name}.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(merged)
+        result["pdf"] = pdf_path
+
+        if with_docx:
+            from docx_export import pdf_to_docx_bytes
+
+            step = time.perf_counter()
+            docx_path = os.path.join(output_dir, f"{base_name}.docx")
+            with open(docx_path, "wb") as f:
+                f.write(pdf_to_docx_bytes(merged))
+            result["docx"] = docx_path
+            result["docx_ms"] = round((time.perf_counter() - step) * 1000, 1)
+
+        result["status"] = "ok"
+
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = f"{type(e).__name__}: {str(e)}"
+
+    result["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def run_batch(rows, templates, output_dir, with_docx=False, workers=None, profile=DEFAULT_PROFILE,
+              doc_type="Proposal"):
+    page1_path, page1_anchors, index_path, remaining_paths = templates
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_load_templates,
+        initargs=(page1_path, page1_anchors, index_path, remaining_paths)
+    ) as executor:
+        futures = [
+            executor.submit(generate_row, row_number, row, output_dir, with_docx, profile, doc_type)
+            for row_number, row in enumerate(rows, start=1)
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"[{len(results)}/{len(futures)}] row {result['row']}: {result['status']} "
+                  f"({result['total_ms']} ms) {result['error']}")
+
+    return sorted(results, key=lambda result: result["row"])
+
+
+def fetch_batch_templates(index_choice, doc_type="Proposal"):
+    # Templates are fetched once here; workers only receive local paths
+    from firebase_config import get_backend
+    from proposal_module import fetch_document_templates, fetch_index_templates
+
+    if doc_type not in DOCUMENT_DEFINITIONS:
+        raise SystemExit(f"{doc_type} documents cannot be generated yet")
+    document_type = DOCUMENT_DEFINITIONS[doc_type]
+
+    bucket = get_backend().bucket
+    firestore_db = get_backend().firestore_db
+
+    templates, anchors = fetch_document_templates(bucket, firestore_db, doc_type, with_anchors=True)
+    index_templates = fetch_index_templates(bucket, firestore_db, doc_type=doc_type)
+
+    if not templates:
+        raise SystemExit(f"No {doc_type} templates found")
+    if not 1 <= index_choice <= len(index_templates):
+        raise SystemExit(f"Index template {index_choice} not available ({len(index_templates)} found)")
+
+    return templates[0], anchors[0], index_templates[index_choice - 1], templates[document_type.body_start:]
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Generate documents in bulk from a CSV file.")
+    arg_parser.add_argument("csv_file", help="CSV with one column per field of the document type "
+                                             "(Proposal: name, email, phone, country and date)")
+    arg_parser.add_argument("--doc-type", choices=sorted(DOCUMENT_DEFINITIONS), default="Proposal")
+    arg_parser.add_argument("--index-template", type=int, default=1,
+                            help="Index page style, numbered as on the 'Select Index Page Style' page")
+    arg_parser.add_argument("--output-dir", default="batch_output")
+    arg_parser.add_argument("--docx", action="store_true", help="Also write a Word document for each row")
+    arg_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    arg_parser.add_argument("--profile", choices=sorted(OUTPUT_PROFILES), default=DEFAULT_PROFILE,
+                            help="Output size profile applied to each document")
+    arg_parser.add_argument("--manifest", default=None, help="Manifest CSV path (default: <output-dir>/manifest.csv)")
+    args = arg_parser.parse_args(argv)
+
+    with open(args.csv_file, newline="", encoding="utf-8-sig") as f:
+        rows = [{key.strip().lower(): (value or "").strip() for key, value in row.items()} for row in csv.DictReader(f)]
+
+    templates = fetch_batch_templates(args.index_template, args.doc_type)
+
+    started = time.perf_counter()
+    results = run_batch(rows, templates, args.output_dir, with_docx=args.docx, workers=args.workers,
+                        profile=args.profile, doc_type=args.doc_type)
+    elapsed = time.perf_counter() - started
+
+    manifest_path = args.manifest or os.path.join(args.output_dir, "manifest.csv")
+    with open(manifest_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+    failed = sum(1 for result in results if result["status"] != "ok")
+    print(f"Generated {len(results) - failed}/{len(results)} {args.doc_type} documents in {elapsed:.1f}s; manifest: {manifest_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,258 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import statistics
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+STAGES = ["fill", "fill_form", "merge", "optimize", "render", "preview", "docx", "storage"]
+
+
+def make_template(pages=6, fields=5, image_kb=0, seed=0):
+    # Synthetic template: labelled fields on every page plus an incompressible image of image_kb
+    import random
+    import fitz
+    from cross_plat import ANCHOR_FIELDS
+
+    labels = (ANCHOR_FIELDS + [f"Field {i}:" for i in range(len(ANCHOR_FIELDS) + 1, fields + 1)])[:fields]
+    rng = random.Random(seed)
+
+    image = None
+    if image_kb:
+        side = max(8, int((image_kb * 1024 / 3) ** 0.5))
+        pix = fitz.Pixmap(fitz.csRGB, side, side, rng.randbytes(side * side * 3), 0)
+        image = pix.tobytes("png")
+
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        page.insert_text((50, 60), f"Synthetic proposal page {page_num + 1}", fontsize=16)
+        step = min(40, 700 / max(1, len(labels)))
+        for i, label in enumerate(labels):
+            page.insert_text((50, 100 + i * step), label, fontsize=14)
+        if image:
+            page.insert_image(fitz.Rect(300, 400, 560, 660), stream=image)
+    data = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return data, labels
+
+
+def _stage_inputs(stage, template, labels, config):
+    from cross_plat import EditTextFile
+    from merge_pdf import Merger
+
+    merge_inputs = config["merge_inputs"]
+    modifications = {label: ": benchmark value" for label in labels}
+    if stage == "storage":
+        # A throwaway local bucket holding storage_objects copies, slowed to storage_latency_ms per request
+        import atexit
+        import shutil
+        import tempfile
+        from local_backend import LocalBucket
+
+        root = tempfile.mkdtemp(prefix="proposal_benchmark_")
+        atexit.register(shutil.rmtree, root, True)
+        bucket = LocalBucket(root)
+        names = [f"templates/template_{i}.pdf" for i in range(config["storage_objects"])]
+        for name in names:
+            bucket.blob(name).upload_from_string(template)
+        bucket.latency = config["storage_latency_ms"] / 1000
+        return bucket, names
+    if stage == "fill":
+        return template, modifications
+    if stage == "fill_form":
+        from cross_plat import compile_form
+        return compile_form(template, fields=labels)[0], modifications
+    merged = Merger([EditTextFile(template).modify_pdf_fields(None, modifications)] +
+                    [template] * (merge_inputs - 1)).merge_pdf_files()
+    if stage == "merge":
+        return [template] * merge_inputs, None
+    return merged, None
+
+
+def _run_stage(stage, source, extra, config):
+    from cross_plat import EditTextFile
+    from merge_pdf import Merger
+    from proposal_module import render_all_pdf_pages, get_pdf_preview, convert_pdf_to_word
+
+    if stage in ("fill", "fill_form"):
+        return len(EditTextFile(source).modify_pdf_fields(None, extra) or b"")
+    if stage == "merge":
+        return len(Merger(source, backend=config["merge_backend"]).merge_pdf_files() or b"")
+    if stage == "optimize":
+        from output_profile import optimize_pdf
+        return len(optimize_pdf(source, config["output_profile"])[0])
+    if stage == "render":
+        return sum(len(image.tobytes()) for image in render_all_pdf_pages(source))
+    if stage == "preview":
+        return len(get_pdf_preview(source))
+    if stage == "docx":
+        return len(convert_pdf_to_word(source) or b"")
+    if stage == "storage":
+        from storage_client import StorageClient
+        client = StorageClient(source, max_workers=config["storage_workers"])
+        try:
+            results = client.map(client.download_bytes, extra)
+        finally:
+            client.executor().shutdown()
+        for _, _, error in results:
+            if error:
+                raise error
+        return sum(len(data) for _, data, _ in results)
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def _peak_rss_mb(who="self"):
+    # who="children": the largest finished, waited-for child process (rasterizer or pdf2docx
+    # workers), which is not part of this process's own peak
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if who == "children" else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _stage_worker(stage, config, queue):
+    try:
+        # Import everything up front so module loading is not counted as stage time
+        import proposal_module
+        logging.disable(logging.INFO)
+
+        template, labels = make_template(config["pages"], config["fields"], config["image_kb"])
+        source, extra = _stage_inputs(stage, template, labels, config)
+
+        timings = []
+        output_bytes = 0
+        for _ in range(config["repeat"]):
+            start = time.perf_counter()
+            output_bytes = _run_stage(stage, source, extra, config)
+            timings.append(time.perf_counter() - start)
+
+        # Pool workers only count towards RUSAGE_CHILDREN once they have exited and been joined
+        from rasterizer import get_rasterizer
+        get_rasterizer().shutdown()
+        queue.put({
+            "wall_s": round(statistics.median(timings), 4),
+            "min_wall_s": round(min(timings), 4),
+            "peak_rss_mb": _peak_rss_mb(),
+            "peak_child_rss_mb": _peak_rss_mb("children"),
+            "output_bytes": output_bytes
+        })
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {str(e)}"})
+    finally:
+        from rasterizer import get_rasterizer
+        get_rasterizer().shutdown()
+
+
+def run_benchmarks(config, stages=STAGES):
+    # Each stage runs in a fresh process so peak RSS is attributable to that stage alone
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for stage in stages:
+        queue = context.Queue()
+        process = context.Process(target=_stage_worker, args=(stage, config, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        results[stage] = result
+        if "error" in result:
+            print(f"{stage:>8}: ERROR {result['error']}")
+        else:
+            print(f"{stage:>8}: {result['wall_s'] * 1000:9.1f} ms  "
+                  f"{result['peak_rss_mb'] or 0:8.1f} MB peak  "
+                  f"{result['peak_child_rss_mb'] or 0:8.1f} MB child peak  {result['output_bytes']:>12} bytes")
+    return results
+
+
+def compare_to_baseline(results, baseline, max_time_regression, max_rss_regression):
+    failures = []
+    for stage, result in results.items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous or "error" in previous:
+            continue
+        if "error" in result:
+            failures.append(f"{stage}: {result['error']}")
+            continue
+        if result["wall_s"] > previous["wall_s"] * (1 + max_time_regression):
+            failures.append(f"{stage}: wall time {result['wall_s']:.4f}s vs baseline {previous['wall_s']:.4f}s")
+        for field, label in (("peak_rss_mb", "peak RSS"), ("peak_child_rss_mb", "child peak RSS")):
+            if result.get(field) and previous.get(field) and \
+                    result[field] > previous[field] * (1 + max_rss_regression):
+                failures.append(f"{stage}: {label} {result[field]} MB vs baseline {previous[field]} MB")
+    return failures
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Offline benchmarks for the proposal PDF pipeline.")
+    arg_parser.add_argument("--pages", type=int, default=6)
+    arg_parser.add_argument("--fields", type=int, default=5)
+    arg_parser.add_argument("--image-kb", type=int, default=200, help="Size of the raw image placed on each page")
+    arg_parser.add_argument("--merge-inputs", type=int, default=6, help="Number of documents merged")
+    arg_parser.add_argument("--merge-backend", default="fitz")
+    arg_parser.add_argument("--output-profile", default="web", help="Profile used by the optimize stage")
+    arg_parser.add_argument("--storage-objects", type=int, default=16, help="Templates downloaded by the storage stage")
+    arg_parser.add_argument("--storage-latency-ms", type=float, default=20, help="Simulated latency per storage request")
+    arg_parser.add_argument("--storage-workers", type=int, default=8, help="Storage client pool size")
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--stages", default=",".join(STAGES))
+    arg_parser.add_argument("--baseline", help="Compare against this baseline JSON and fail on regressions")
+    arg_parser.add_argument("--save-baseline", help="Write the results to this baseline JSON")
+    arg_parser.add_argument("--max-time-regression", type=float, default=0.25, help="Allowed wall time increase (0.25 = 25%%)")
+    arg_parser.add_argument("--max-rss-regression", type=float, default=0.25, help="Allowed peak RSS increase")
+    args = arg_parser.parse_args(argv)
+
+    config = {
+        "pages": args.pages,
+        "fields": args.fields,
+        "image_kb": args.image_kb,
+        "merge_inputs": args.merge_inputs,
+        "merge_backend": args.merge_backend,
+        "output_profile": args.output_profile,
+        "storage_objects": args.storage_objects,
+        "storage_latency_ms": args.storage_latency_ms,
+        "storage_workers": args.storage_workers,
+        "repeat": args.repeat
+    }
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+
+    print(f"Benchmarking {', '.join(stages)} with {config}")
+    results = run_benchmarks(config, stages)
+
+    report = {
+        "config": config,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "stages": results
+    }
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("⚠️ Baseline was recorded with a different configuration")
+        failures = compare_to_baseline(results, baseline, args.max_time_regression, args.max_rss_regression)
+        for failure in failures:
+            print(f"❌ Regression: {failure}")
+        if failures:
+            return 1
+        print("✅ No regressions against baseline")
+
+    return 1 if any("error" in result for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
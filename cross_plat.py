@@ -1,114 +1,424 @@
 import os
-import subprocess
-from docx import Document
+import re
+import hashlib
 import fitz
 
 
+def open_pdf(source):
+    # Accepts a path, raw PDF bytes (bytes/bytearray/memoryview) or an open fitz.Document.
+    if isinstance(source, fitz.Document):
+        return source
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    if not os.path.exists(source):
+        raise FileNotFoundError(f"Input PDF not found: {source}")
+    return fitz.open(source)
+
+
+def pdf_bytes(source):
+    if isinstance(source, fitz.Document):
+        return source.tobytes()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    with open(source, "rb") as f:
+        return f.read()
+
+
+# Labels the proposal templates carry; anchors for these are discovered at upload time
+ANCHOR_FIELDS = ["Name:", "Email:", "Phone", "Country", "14 April 2025"]
+ANCHOR_MAP_VERSION = 1
+
+# y_offset the page-1 fill uses for the proposal templates
+PROPOSAL_Y_OFFSET = 8
+
+# Compiled templates carry one text widget per matched label, named FORM_FIELD_PREFIX + n with
+# the label as its tooltip, and a /ProposalForm entry in the catalog recording the layout.
+FORM_VERSION = 1
+FORM_FIELD_PREFIX = "proposal_field_"
+FORM_FONT_SIZE = 23
+
+
+def proposal_modifications(name, email, phone, country, formatted_date):
+    return {
+        "Name:": f": {name}",
+        "Email:": f": {email}",
+        "Phone": f": {phone}",
+        "Country": f": {country}",
+        "14 April 2025": f"{formatted_date}"
+    }
+
+
+def discover_anchors(source, fields=ANCHOR_FIELDS):
+    # Builds a Firestore-friendly anchor map: one entry per field found on each page.
+    data = pdf_bytes(source)
+    doc = fitz.open(stream=data, filetype="pdf")
+    try:
+        anchors = []
+        for page_num, page in enumerate(doc):
+            for field, rect in FieldLocator(page).locate(fields).items():
+                if rect is not None:
+                    anchors.append({"field": field, "page": page_num, "rect": list(rect)})
+
+        return {
+            "version": ANCHOR_MAP_VERSION,
+            "source_md5": hashlib.md5(data).hexdigest(),
+            "page_count": len(doc),
+            "fields_searched": list(fields),
+            "anchors": anchors
+        }
+    finally:
+        doc.close()
+
+
+def anchor_pages(anchor_map, data, page_count, fields):
+    # Returns {page: {field: Rect or None}} when the stored map is usable for these
+    # bytes and fields, otherwise None so the caller falls back to searching.
+    if not anchor_map or anchor_map.get("version") != ANCHOR_MAP_VERSION:
+        return None
+    if anchor_map.get("source_md5") != hashlib.md5(data).hexdigest():
+        return None
+    if anchor_map.get("page_count") != page_count:
+        return None
+    if not set(fields) <= set(anchor_map.get("fields_searched", [])):
+        return None
+
+    pages = {page: dict.fromkeys(fields) for page in range(page_count)}
+    for anchor in anchor_map.get("anchors", []):
+        if anchor["field"] in pages[anchor["page"]]:
+            pages[anchor["page"]][anchor["field"]] = fitz.Rect(anchor["rect"])
+    return pages
+
+
+def _widget_text_origin(doc, widget):
+    # Text origin inside the widget's appearance stream, relative to its bottom-left corner
+    ap = doc.xref_get_key(widget.xref, "AP/N")
+    if ap[0] != "xref":
+        return None
+    match = re.search(rb"([-\d.]+)\s+([-\d.]+)\s+Td", doc.xref_stream(int(ap[1].split()[0])) or b"")
+    return (float(match.group(1)), float(match.group(2))) if match else None
+
+
+def compile_form(source, fields=ANCHOR_FIELDS, y_offset=PROPOSAL_Y_OFFSET):
+    # Turns labelled fields into text widgets placed where the redact-and-overlay fill would
+    # write, with the placeholders already redacted. Returns (pdf bytes, compiled field count);
+    # the bytes are None when no field was found.
+    doc = open_pdf(pdf_bytes(source))
+    try:
+        count = 0
+        for page_num, page in enumerate(doc):
+            locator = FieldLocator(page)
+            if not locator.words:
+                continue
+
+            layouts = []
+            for field, inst in locator.locate(fields).items():
+                if inst is None:
+                    continue
+                area, point = EditTextFile._field_layout(field, inst, y_offset)
+                page.add_redact_annot(area, fill=(1, 1, 1))
+                layouts.append((field, point))
+
+            if not layouts:
+                continue
+            page.apply_redactions()
+
+            height = FORM_FONT_SIZE * 1.4
+            for field, (x, baseline) in layouts:
+                widget = fitz.Widget()
+                widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+                widget.field_name = f"{FORM_FIELD_PREFIX}{count}"
+                widget.field_label = field
+                # Values are free-length, so the widget runs to the page edge rather than clipping
+                widget.rect = fitz.Rect(x, baseline - height, page.rect.x1, baseline)
+                widget.text_font = "Helv"
+                widget.text_fontsize = FORM_FONT_SIZE
+                widget.text_color = (0, 0, 0)
+                widget.border_width = 0
+                widget.field_value = ""
+                # Regenerated the way a fill will regenerate it, so the padding measured is the real one
+                widget = page.load_widget(page.add_widget(widget).xref)
+                widget.update()
+
+                origin = _widget_text_origin(doc, widget)
+                if origin:
+                    # Line the text origin up with the point insert_text would use
+                    dx, dy = origin
+                    widget.rect = widget.rect + (-dx, dy, -dx, dy)
+                    widget.update()
+                count += 1
+
+        if not count:
+            return None, 0
+
+        doc.xref_set_key(doc.pdf_catalog(), "ProposalForm",
+                         f"<</Version {FORM_VERSION} /YOffset {y_offset}>>")
+        return doc.tobytes(garbage=3, deflate=True), count
+    finally:
+        doc.close()
+
+
+def form_layout(doc):
+    # The y_offset a compiled template was built with, or None for a plain template
+    version = doc.xref_get_key(doc.pdf_catalog(), "ProposalForm/Version")
+    if version[0] != "int" or int(version[1]) != FORM_VERSION:
+        return None
+    y_offset = doc.xref_get_key(doc.pdf_catalog(), "ProposalForm/YOffset")
+    return float(y_offset[1]) if y_offset[0] in ("int", "real") else 0
+
+
+class FieldLocator:
+    # Extracts a page's characters once and resolves field labels against a
+    # normalized index that ignores case, colons and whitespace. A match must start
+    # a word (so "Phone" never hits "Telephone") but may end inside one when the next
+    # character is not a letter or digit, as in "Name:_____" or "Country/Region".
+    def __init__(self, page):
+        self.words = []
+        for block in page.get_text("rawdict")["blocks"]:
+            for line in block.get("lines", []):
+                word = []
+                for span in line["spans"]:
+                    for char in span["chars"]:
+                        if char["c"].isspace():
+                            if word:
+                                self.words.append(word)
+                            word = []
+                        else:
+                            word.append((char["c"], fitz.Rect(char["bbox"])))
+                if word:
+                    self.words.append(word)
+
+        # Flattened normalized text plus a (word, char) back-reference per character
+        self.text = []
+        self.positions = []
+        self.word_starts = set()
+        self.word_ends = set()
+        for word_idx, word in enumerate(self.words):
+            start = len(self.text)
+            for char_idx, (c, _) in enumerate(word):
+                if c == ":":
+                    continue
+                self.text.append(c.lower())
+                self.positions.append((word_idx, char_idx))
+            if len(self.text) > start:
+                self.word_starts.add(start)
+                self.word_ends.add(len(self.text))
+        self.text = "".join(self.text)
+
+    @staticmethod
+    def normalize(text):
+        return "".join(text.replace(":", "").lower().split())
+
+    def locate(self, fields):
+        return {field: self.find(field) for field in fields}
+
+    def find(self, field):
+        needle = self.normalize(field)
+        if not needle:
+            return None
+
+        pos = self.text.find(needle)
+        while pos != -1:
+            end = pos + len(needle)
+            if pos in self.word_starts and (end in self.word_ends or not self.text[end].isalnum()):
+                return self._rect(pos, end, ":" in field)
+            pos = self.text.find(needle, pos + 1)
+        return None
+
+    def _rect(self, start, end, include_colon):
+        word_idx, char_idx = self.positions[start]
+        last_word, last_char = self.positions[end - 1]
+        chars = []
+        for idx in range(word_idx, last_word + 1):
+            word = self.words[idx]
+            first = char_idx if idx == word_idx else 0
+            stop = last_char + 1 if idx == last_word else len(word)
+            chars.extend(word[first:stop])
+
+        if include_colon:
+            # The label's own colon may directly follow it or stand alone as the next word
+            trailing = self.words[last_word][last_char + 1:]
+            if not trailing and last_word + 1 < len(self.words):
+                following = self.words[last_word + 1]
+                if all(c[0] == ":" for c in following):
+                    trailing = following
+            for c in trailing:
+                if c[0] != ":":
+                    break
+                chars.append(c)
+
+        rect = fitz.Rect(chars[0][1])
+        for _, bbox in chars[1:]:
+            rect |= bbox
+        return rect
+
+
 class EditTextFile:
     def __init__(self, file_path):
+        # file_path may also be PDF bytes or an open fitz.Document
         self.file_path = file_path
+        self.match_report = None
+
+    @staticmethod
+    def _field_layout(field, inst, y_offset):
+        # Returns the area to redact and the insertion point for a matched field
+        if field == "14 April 2025":
+            # Redact and replace date field directly using rectangle
+            # Custom X position — adjust this as needed
+            custom_x = 45
+            custom_y = inst.y0 + (inst.y1 - inst.y0) / 2 + y_offset
+
+            # Redact original date region
+            date_area = fitz.Rect(
+                inst.x0 - 2,
+                inst.y0 - 2,
+                inst.x1 + 100,
+                inst.y1 + 2
+            )
+            return date_area, (custom_x, custom_y)
+
+        value_area = fitz.Rect(
+            inst.x1,
+            inst.y0 - 2,
+            inst.x1 + 250,
+            inst.y1 + 2
+        )
+        y_pos = inst.y0 + (inst.height / 2) + y_offset
+        return value_area, (inst.x1 + 2, y_pos)
 
-    def modify_pdf_fields(self, output_pdf, modifications, y_offset=0):
-        input_pdf = self.file_path
+    @staticmethod
+    def _insert_value(page, point, new_value):
+        page.insert_text(
+            point,
+            new_value,
+            fontsize=23,
+            color=(0, 0, 0),
+            fontname="helv"
+        )
+
+    @staticmethod
+    def _fill_form(doc, modifications, y_shift):
+        # Fast path for compiled templates: set widget values, then flatten them into the page
+        report = {"pages": len(doc), "source": "form", "matched": {}, "missing": {}, "unreadable_pages": []}
+
+        for page_num, page in enumerate(doc):
+            found = set()
+            for widget in page.widgets():
+                if not widget.field_name.startswith(FORM_FIELD_PREFIX):
+                    continue
+                field = widget.field_label
+                if field not in modifications:
+                    continue
+                if y_shift:
+                    widget.rect = widget.rect + (0, y_shift, 0, y_shift)
+                widget.field_value = modifications[field]
+                widget.update()
+                found.add(field)
+                report["matched"].setdefault(field, []).append(page_num + 1)
+
+            for field in modifications:
+                if field not in found:
+                    report["missing"].setdefault(field, []).append(page_num + 1)
+
+        # bake() arrived in PyMuPDF 1.24; older versions hand back a filled, unflattened form
+        if hasattr(doc, "bake"):
+            doc.bake(annots=False, widgets=True)
+            report["flattened"] = True
+        else:
+            report["flattened"] = False
+        doc.xref_set_key(doc.pdf_catalog(), "ProposalForm", "null")
+        return report
+
+    def modify_pdf_fields(self, output_pdf, modifications, y_offset=0, batched=True, anchors=None):
+        # Returns the filled PDF as bytes; output_pdf is an optional file sink.
+        # Per-field results are left in self.match_report. batched=False applies
+        # each field's redaction before inserting its value (one rewrite per field);
+        # fields are still located once per page up front, unlike earlier versions,
+        # which searched the page again after every redaction.
+        # anchors is a map from discover_anchors(); it is ignored when stale.
+        # Templates prepared by compile_form() are filled through their widgets instead.
+        result = None
 
         try:
-            if not os.path.exists(input_pdf):
-                raise FileNotFoundError(f"Input PDF not found: {self.file_path}")
+            # Working from a copy also means a caller's open document is never modified
+            data = pdf_bytes(self.file_path)
+            doc = fitz.open(stream=data, filetype="pdf")
+
+            compiled_offset = form_layout(doc)
+            if compiled_offset is not None:
+                self.match_report = self._fill_form(doc, modifications, y_offset - compiled_offset)
+                result = doc.tobytes(garbage=1, deflate=True)
+                if output_pdf:
+                    with open(output_pdf, "wb") as f:
+                        f.write(result)
+                return result
 
-            doc = fitz.open(self.file_path)
-            print(f"Processing {len(doc)} pages...")
+            stored = anchor_pages(anchors, data, len(doc), modifications.keys())
+            report = {
+                "pages": len(doc),
+                "source": "anchors" if stored else "search",
+                "matched": {},
+                "missing": {},
+                "unreadable_pages": []
+            }
 
             for page_num, page in enumerate(doc):
-                # print(f"\nAnalyzing page {page_num + 1}...")
-                text_instances = page.get_text("words")
+                if stored:
+                    matches = stored[page_num]
+                else:
+                    locator = FieldLocator(page)
 
-                if not text_instances:
-                    print("Warning: No text found on this page (may be scanned)")
-                    continue
+                    if not locator.words:
+                        report["unreadable_pages"].append(page_num + 1)
+                        continue
+
+                    matches = locator.locate(modifications.keys())
 
-                # print("Text elements found on page:")
-                for inst in text_instances:
-                    print(".")
+                pending = []
 
                 for field, new_value in modifications.items():
-                    found = False
-                    variations = [
-                        field,
-                        field.replace(":", ""),
-                        field.replace(":", " :"),
-                        field.lower(),
-                        field.upper(),
-                        field.replace(" ", ""),
-                        field.replace(" ", "  ")
-                    ]
-
-                    for variation in variations:
-                        instances = page.search_for(variation)
-                        if instances:
-                            # print(f"Found potential match for '{variation}' on page {page_num + 1}")
-                            for inst in instances:
-                                try:
-                                    if field == "14 April 2025":
-                                        # Redact and replace date field directly using rectangle
-                                        # Custom X position — adjust this as needed
-                                        custom_x = 45
-                                        custom_y = inst.y0 + (inst.y1 - inst.y0) / 2 + y_offset
-
-                                        # Redact original date region
-                                        date_area = fitz.Rect(
-                                            inst.x0 - 2,
-                                            inst.y0 - 2,
-                                            inst.x1 + 100,
-                                            inst.y1 + 2
-                                        )
-                                        page.add_redact_annot(date_area, fill=(1, 1, 1))
-                                        page.apply_redactions()
-
-                                        # Custom-positioned new date
-                                        page.insert_text(
-                                            (custom_x, custom_y),
-                                            new_value,
-                                            fontsize=23,
-                                            color=(0, 0, 0),
-                                            fontname="helv"
-                                        )
-
-                                    else:
-                                        value_area = fitz.Rect(
-                                            inst.x1,
-                                            inst.y0 - 2,
-                                            inst.x1 + 250,
-                                            inst.y1 + 2
-                                        )
-                                        page.add_redact_annot(value_area, fill=(1, 1, 1))
-                                        page.apply_redactions()
-
-                                        y_pos = inst.y0 + (inst.height / 2) + y_offset
-                                        page.insert_text(
-                                            (inst.x1 + 2, y_pos),
-                                            new_value,
-                                            fontsize=23,
-                                            color=(0, 0, 0),
-                                            fontname="helv"
-                                        )
-
-                                    found = True
-                                    # print(f"✅ Modified field: {field}")
-                                    break
-
-                                except Exception as e:
-                                    print(f"❌ Error processing {field}: {str(e)}")
-                                    continue
-
-                            if found:
-                                break
-
-                    if not found:
-                        print(f"⚠️ Warning: Field '{field}' not found on page {page_num + 1}")
+                    inst = matches[field]
+                    if inst is None:
+                        report["missing"].setdefault(field, []).append(page_num + 1)
+                        continue
+
+                    area, point = self._field_layout(field, inst, y_offset)
+
+                    if batched:
+                        page.add_redact_annot(area, fill=(1, 1, 1))
+                        pending.append((field, point, new_value))
+                        continue
+
+                    try:
+                        page.add_redact_annot(area, fill=(1, 1, 1))
+                        page.apply_redactions()
+                        self._insert_value(page, point, new_value)
+                        report["matched"].setdefault(field, []).append(page_num + 1)
+
+                    except Exception as e:
+                        report["missing"].setdefault(field, []).append(page_num + 1)
+                        print(f"❌ Error processing {field}: {str(e)}")
+
+                if pending:
+                    # One content-stream rewrite per page instead of one per field
+                    page.apply_redactions()
+
+                for field, point, new_value in pending:
+                    try:
+                        self._insert_value(page, point, new_value)
+                        report["matched"].setdefault(field, []).append(page_num + 1)
+
+                    except Exception as e:
+                        report["missing"].setdefault(field, []).append(page_num + 1)
+                        print(f"❌ Error processing {field}: {str(e)}")
+
+            self.match_report = report
 
             if len(doc) > 0:
-                doc.save(output_pdf)
-                print(f"\n✅ Successfully saved modified PDF to {output_pdf}")
+                result = doc.tobytes()
+                if output_pdf:
+                    with open(output_pdf, "wb") as f:
+                        f.write(result)
+                    print(f"\n✅ Successfully saved modified PDF to {output_pdf}")
             else:
                 print("❌ Error: No pages processed - output not saved")
 
@@ -118,5 +428,7 @@ class EditTextFile:
             if 'doc' in locals():
                 doc.close()
 
+        return result
+
 
 
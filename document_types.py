@@ -0,0 +1,44 @@
+from cross_plat import proposal_modifications, PROPOSAL_Y_OFFSET
+
+
+class DocumentType:
+    # Everything the shared document pipeline needs to know about one document type.
+    # fields: (key, label, kind) for the details form, kind being "text", "country" or "date".
+    # modifications: turns the submitted field values into EditTextFile modifications.
+    # body_start: index of the first template appended after the filled page and index page.
+    def __init__(self, name, title, preview_title, fields, modifications, y_offset=0, body_start=1,
+                 file_stem=None):
+        self.name = name
+        self.title = title
+        self.preview_title = preview_title
+        self.fields = fields
+        self.modifications = modifications
+        self.y_offset = y_offset
+        self.body_start = body_start
+        self.file_stem = file_stem or name.lower().replace(" ", "_")
+
+
+def _proposal_modifications(values):
+    return proposal_modifications(
+        values["name"], values["email"], values["phone"], values["country"], values["date"].strftime("%d %B %Y")
+    )
+
+
+DOCUMENT_DEFINITIONS = {
+    "Proposal": DocumentType(
+        "Proposal",
+        title="Proposal PDF Generator",
+        preview_title="📄 Full Proposal Preview",
+        fields=[
+            ("name", "Name", "text"),
+            ("email", "Email", "text"),
+            ("phone", "Phone", "text"),
+            ("country", "Select Country", "country"),
+            ("date", "Date", "date")
+        ],
+        modifications=_proposal_modifications,
+        y_offset=PROPOSAL_Y_OFFSET,
+        # The selected index page stands in for the second proposal template
+        body_start=2
+    )
+}
@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+import fitz
+from pdf2docx import Converter
+from cross_plat import pdf_bytes
+from render_cache import content_hash
+from metrics import span, current_request_id, current_session_id
+
+
+# pdf2docx's multi-process mode reopens the PDF by path in each worker and only pays off on longer documents
+MULTI_PROCESS_MIN_PAGES = 4
+
+
+def _convert_in_child(pdf_path, docx_path, cpu_count):
+    # Runs in a freshly spawned, single-threaded process, where pdf2docx's fork-based pool is safe
+    try:
+        cv = Converter(pdf_path)
+        try:
+            cv.convert(docx_path, start=0, end=None, multi_processing=True, cpu_count=cpu_count)
+        finally:
+            cv.close()
+    except BaseException:
+        with open(f"{docx_path}.error", "w", encoding="utf-8") as f:
+            f.write(traceback.format_exc())
+        raise
+
+
+def pdf_to_docx_bytes(pdf, multi_processing=False, cpu_count=None, workspace=None):
+    # workspace: the session workspace that holds the files multi-process mode needs
+    data = pdf_bytes(pdf)
+
+    if not multi_processing:
+        cv = Converter(stream=data)
+        try:
+            buffer = BytesIO()
+            cv.convert(buffer, start=0, end=None, multi_processing=False)
+            return buffer.getvalue()
+        finally:
+            cv.close()
+
+    if workspace is not None:
+        workspace.check_quota(len(data))
+        work_dir = workspace.scratch_dir(prefix="docx_export_")
+    else:
+        work_dir = tempfile.mkdtemp(prefix="docx_export_")
+
+    try:
+        pdf_path = os.path.join(work_dir, "proposal.pdf")
+        docx_path = os.path.join(work_dir, "proposal.docx")
+        with open(pdf_path, "wb") as f:
+            f.write(data)
+
+        # pdf2docx starts a plain multiprocessing.Pool, which forks; forking the threaded server
+        # is not safe (see rasterizer), so the pool is started from a spawned process instead
+        # daemon=False: a daemonic process may not start the pool's children
+        process = multiprocessing.get_context("spawn").Process(
+            target=_convert_in_child, args=(pdf_path, docx_path, cpu_count or os.cpu_count()), daemon=False
+        )
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            error_path = f"{docx_path}.error"
+            detail = f"exit code {process.exitcode}"
+            if os.path.exists(error_path):
+                with open(error_path, encoding="utf-8") as f:
+                    detail = f.read().strip().splitlines()[-1]
+            raise RuntimeError(f"Word conversion failed: {detail}")
+
+        with open(docx_path, "rb") as f:
+            return f.read()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+class DocxExporter:
+    # Runs conversions off the script thread and keeps finished documents keyed by PDF hash.
+    # _jobs only holds running conversions; a failure is kept in _errors until it is read.
+    def __init__(self, max_workers=2, max_results=16):
+        self.max_results = max_results
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="docx_export")
+        self._jobs = {}
+        self._results = OrderedDict()
+        self._errors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, pdf):
+        data = pdf_bytes(pdf)
+        key = content_hash(data)
+
+        with self._lock:
+            if key in self._results:
+                return key
+            if key in self._jobs:
+                return key
+            self._errors.pop(key, None)
+            self._jobs[key] = self._executor.submit(
+                self._convert, key, data, current_request_id(), current_session_id()
+            )
+        return key
+
+    def status(self, key):
+        with self._lock:
+            if key in self._results:
+                return "done"
+            if key in self._errors:
+                return "failed"
+            return "running" if key in self._jobs else None
+
+    def error(self, key):
+        # Reading a failure clears it, so the next status is None and the conversion can be retried
+        with self._lock:
+            return self._errors.pop(key, None)
+
+    def result(self, key):
+        with self._lock:
+            docx = self._results.get(key)
+            if docx is not None:
+                self._results.move_to_end(key)
+            return docx
+
+    def _convert(self, key, data, request_id=None, session_id=None):
+        try:
+            docx = self._to_docx(data, request_id, session_id)
+        except Exception as e:
+            with self._lock:
+                self._errors[key] = e
+                self._jobs.pop(key, None)
+                while len(self._errors) > self.max_results:
+                    self._errors.popitem(last=False)
+            raise
+
+        with self._lock:
+            self._results[key] = docx
+            self._jobs.pop(key, None)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return key
+
+    def _to_docx(self, data, request_id, session_id):
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            page_count = doc.page_count
+        multi_processing = page_count >= MULTI_PROCESS_MIN_PAGES
+        with span("docx_convert", request_id=request_id, session_id=session_id,
+                  pages=page_count, multi_processing=multi_processing):
+            workspace = None
+            if multi_processing and session_id:
+                from workspace import get_workspace_manager
+                workspace = get_workspace_manager().get(session_id)
+            return pdf_to_docx_bytes(data, multi_processing=multi_processing, workspace=workspace)
+
+
+_docx_exporter = None
+_docx_exporter_lock = threading.Lock()
+
+
+def get_docx_exporter():
+    global _docx_exporter
+    with _docx_exporter_lock:
+        if _docx_exporter is None:
+            _docx_exporter = DocxExporter()
+        return _docx_exporter
@@ -1,52 +1,160 @@
-import pyrebase
 import os
+import threading
+from functools import cached_property
 from dotenv import load_dotenv
-import streamlit as st
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
 
 load_dotenv()
 
 
-firebaseConfig = {
-    "apiKey": st.secrets["API_KEY"],
-    "authDomain": st.secrets["AUTH_DOMAIN"],
-    "databaseURL": st.secrets["DATABASE_URL"],
-    "projectId": st.secrets["PROJECT_ID"],
-    "storageBucket": st.secrets["STORAGE_BUCKET"],
-    "messagingSenderId": st.secrets["MESSAGING_SENDER_ID"],
-    "appId": st.secrets["APP_ID"],
-    "measurementId": st.secrets["MEASUREMENT_ID"]
-}
-
-
-firebase_credentials = {
-    "type": st.secrets["firebase"]["type"],
-    "project_id": st.secrets["firebase"]["project_id"],
-    "private_key_id": st.secrets["firebase"]["private_key_id"],
-    "private_key": st.secrets["firebase"]["private_key"].replace("\\n", "\n"),  # <- no replace() here
-    "client_email": st.secrets["firebase"]["client_email"],
-    "client_id": st.secrets["firebase"]["client_id"],
-    "auth_uri": st.secrets["firebase"]["auth_uri"],
-    "token_uri": st.secrets["firebase"]["token_uri"],
-    "auth_provider_x509_cert_url": st.secrets["firebase"]["auth_provider_x509_cert_url"],
-    "client_x509_cert_url": st.secrets["firebase"]["client_x509_cert_url"]
-}
-
-cred = credentials.Certificate(firebase_credentials)
-
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred, {
-        'storageBucket': st.secrets["STORAGE_BUCKET"]
-    })
-
-# Initialize services
-
-bucket = storage.bucket(st.secrets["STORAGE_BUCKET"])
-firestore_db = firestore.client()
-
-# Initialize Pyrebase
-firebase = pyrebase.initialize_app(firebaseConfig)
-auth = firebase.auth()
-rt_db = firebase.database()
+# Services are built on first use, so a page only pays for the clients it touches.
+# Set PROPOSAL_BACKEND=local to run against local_backend without any credentials. It accepts
+# any password, so it is refused wherever Firebase secrets are configured.
+BACKEND_NAME = os.environ.get("PROPOSAL_BACKEND", "firebase")
 
+
+class FirebaseBackend:
+    @cached_property
+    def secrets(self):
+        import streamlit as st
+        return st.secrets
+
+    @cached_property
+    def app(self):
+        import firebase_admin
+        from firebase_admin import credentials
+
+        firebase_credentials = {
+            "type": self.secrets["firebase"]["type"],
+            "project_id": self.secrets["firebase"]["project_id"],
+            "private_key_id": self.secrets["firebase"]["private_key_id"],
+            "private_key": self.secrets["firebase"]["private_key"].replace("\\n", "\n"),  # <- no replace() here
+            "client_email": self.secrets["firebase"]["client_email"],
+            "client_id": self.secrets["firebase"]["client_id"],
+            "auth_uri": self.secrets["firebase"]["auth_uri"],
+            "token_uri": self.secrets["firebase"]["token_uri"],
+            "auth_provider_x509_cert_url": self.secrets["firebase"]["auth_provider_x509_cert_url"],
+            "client_x509_cert_url": self.secrets["firebase"]["client_x509_cert_url"]
+        }
+
+        if not firebase_admin._apps:
+            cred = credentials.Certificate(firebase_credentials)
+            return firebase_admin.initialize_app(cred, {
+                'storageBucket': self.secrets["STORAGE_BUCKET"]
+            })
+        return firebase_admin.get_app()
+
+    @cached_property
+    def bucket(self):
+        from firebase_admin import storage
+        from storage_client import pool_http_connections
+        bucket = storage.bucket(self.secrets["STORAGE_BUCKET"], app=self.app)
+        pool_http_connections(bucket.client)
+        return bucket
+
+    @cached_property
+    def firestore_db(self):
+        from firebase_admin import firestore
+        return firestore.client(app=self.app)
+
+    @cached_property
+    def pyrebase_app(self):
+        import pyrebase
+
+        firebaseConfig = {
+            "apiKey": self.secrets["API_KEY"],
+            "authDomain": self.secrets["AUTH_DOMAIN"],
+            "databaseURL": self.secrets["DATABASE_URL"],
+            "projectId": self.secrets["PROJECT_ID"],
+            "storageBucket": self.secrets["STORAGE_BUCKET"],
+            "messagingSenderId": self.secrets["MESSAGING_SENDER_ID"],
+            "appId": self.secrets["APP_ID"],
+            "measurementId": self.secrets["MEASUREMENT_ID"]
+        }
+        return pyrebase.initialize_app(firebaseConfig)
+
+    @cached_property
+    def auth(self):
+        return self.pyrebase_app.auth()
+
+    @cached_property
+    def rt_db(self):
+        return self.pyrebase_app.database()
+
+    @property
+    def admin_emails(self):
+        return self.secrets["custom"]["ADMIN_EMAILS"]
+
+
+class LocalBackend:
+    def __init__(self, root=None):
+        self.root = root or os.environ.get("LOCAL_BACKEND_DIR", os.path.join(os.getcwd(), ".local_backend"))
+
+    @cached_property
+    def bucket(self):
+        from local_backend import LocalBucket
+        return LocalBucket(os.path.join(self.root, "storage"),
+                           latency=float(os.environ.get("LOCAL_STORAGE_LATENCY_MS", "0")) / 1000,
+                           failure_rate=float(os.environ.get("LOCAL_STORAGE_FAILURE_RATE", "0")))
+
+    @cached_property
+    def firestore_db(self):
+        from local_backend import MemoryFirestore
+        return MemoryFirestore()
+
+    @cached_property
+    def auth(self):
+        from local_backend import LocalAuth
+        return LocalAuth()
+
+    @property
+    def rt_db(self):
+        return None
+
+    @property
+    def admin_emails(self):
+        return [email.strip() for email in os.environ.get("LOCAL_ADMIN_EMAILS", "").split(",") if email.strip()]
+
+
+BACKENDS = {"firebase": FirebaseBackend, "local": LocalBackend}
+
+
+def firebase_secrets_present():
+    import streamlit as st
+    try:
+        return "firebase" in st.secrets
+    except Exception:
+        # No secrets.toml anywhere Streamlit looks
+        return False
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if BACKEND_NAME not in BACKENDS:
+                raise ValueError(f"Unknown PROPOSAL_BACKEND: {BACKEND_NAME}")
+            if BACKEND_NAME == "local":
+                if firebase_secrets_present():
+                    raise RuntimeError("PROPOSAL_BACKEND=local is not allowed where Firebase secrets are "
+                                       "configured; unset it, or run without secrets.toml")
+                print("WARNING: PROPOSAL_BACKEND=local: storage, Firestore and auth are local stand-ins "
+                      "and any password is accepted. Never use this in a deployment.")
+            _backend = BACKENDS[BACKEND_NAME]()
+        return _backend
+
+
+def set_backend(backend):
+    # Lets scripts and tests swap in a LocalBackend (or any object with the same attributes)
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def __getattr__(name):
+    # Keeps `from firebase_config import bucket, firestore_db, auth, rt_db` working, lazily
+    if name in ("bucket", "firestore_db", "auth", "rt_db"):
+        return getattr(get_backend(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
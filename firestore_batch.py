@@ -0,0 +1,98 @@
+from storage_client import get_storage
+import metrics
+
+
+# Firestore rejects write batches with more than 500 operations
+FIRESTORE_BATCH_LIMIT = 500
+
+
+def commit_writes(firestore_db, writes, batch_limit=FIRESTORE_BATCH_LIMIT):
+    # writes: [(operation, document_ref, data)] with operation in "set", "update", "delete".
+    # Each chunk of batch_limit writes commits atomically; up to the limit that makes the
+    # whole call all-or-nothing.
+    report = {"documents": len(writes), "batches": 0, "committed": 0, "error": None}
+
+    for start in range(0, len(writes), batch_limit):
+        batch = firestore_db.batch()
+        chunk = writes[start:start + batch_limit]
+        for operation, reference, data in chunk:
+            if operation == "delete":
+                batch.delete(reference)
+            elif operation == "update":
+                batch.update(reference, data)
+            else:
+                batch.set(reference, data)
+
+        try:
+            with metrics.span("firestore.batch_commit", writes=len(chunk)):
+                batch.commit()
+        except Exception as e:
+            report["error"] = str(e)
+            break
+
+        report["batches"] += 1
+        report["committed"] += len(chunk)
+
+    return report
+
+
+def delete_blobs(bucket, blob_names):
+    # Deletes concurrently on the storage pool; a blob that is already gone counts as deleted
+    storage = get_storage(bucket)
+
+    def delete(name):
+        with metrics.span("storage.delete", blob=name):
+            storage.delete(name)
+
+    deleted, errors = [], []
+    for name, _, error in storage.map(delete, blob_names):
+        if error:
+            errors.append({"blob": name, "error": str(error)})
+        else:
+            deleted.append(name)
+    return deleted, errors
+
+
+def reorder_templates(firestore_db, collection_name, ordered_ids):
+    collection = firestore_db.collection(collection_name)
+    writes = [
+        ("update", collection.document(doc_id), {"order": new_order})
+        for new_order, doc_id in enumerate(ordered_ids, start=1)
+    ]
+    report = commit_writes(firestore_db, writes)
+    report["operation"] = "reorder"
+    return report
+
+
+def delete_templates(firestore_db, bucket, collection_name, storage_prefix, templates_by_id, selected_ids):
+    # Deletes the records in one batch, then their template, thumbnail and form blobs concurrently.
+    # Blobs still referenced by a remaining record are kept.
+    from thumbnail_store import thumbnail_path
+
+    collection = firestore_db.collection(collection_name)
+    report = commit_writes(firestore_db, [("delete", collection.document(t_id), None) for t_id in selected_ids])
+    report.update(operation="delete", blobs_deleted=[], blob_errors=[], blobs_kept=[])
+    if report["error"] or bucket is None:
+        return report
+
+    still_referenced = {
+        data.get("filename") for t_id, data in templates_by_id.items() if t_id not in selected_ids
+    }
+
+    blob_names = []
+    for t_id in selected_ids:
+        data = templates_by_id.get(t_id) or {}
+        filename = data.get("filename")
+        if not filename:
+            continue
+        template_blob = f"{storage_prefix}{filename}"
+        if filename in still_referenced:
+            report["blobs_kept"].append(template_blob)
+            continue
+        blob_names.append(template_blob)
+        blob_names.append(data.get("thumbnail_path") or thumbnail_path(template_blob))
+        if data.get("form_path"):
+            blob_names.append(data["form_path"])
+
+    report["blobs_deleted"], report["blob_errors"] = delete_blobs(bucket, sorted(set(blob_names)))
+    return report
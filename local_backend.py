@@ -0,0 +1,358 @@
+import base64
+import copy
+import enum
+import hashlib
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+
+# Local stand-ins for the Firebase services the app uses: a filesystem-backed
+# Storage bucket, an in-memory Firestore and a password-less auth client.
+# Only the calls made by this codebase are implemented.
+
+
+def _not_found(message):
+    from google.api_core.exceptions import NotFound
+    return NotFound(message)
+
+
+class LocalBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.generation = None
+        self.md5_hash = None
+        self.size = None
+        self.chunk_size = None
+
+    @property
+    def path(self):
+        return os.path.join(self.bucket.root, *self.name.split("/"))
+
+    def exists(self, **kwargs):
+        self.bucket.simulate_request()
+        return os.path.isfile(self.path)
+
+    def reload(self, **kwargs):
+        self.bucket.simulate_request()
+        self._load_metadata()
+
+    def _load_metadata(self):
+        if not os.path.isfile(self.path):
+            raise _not_found(f"No such object: {self.bucket.name}/{self.name}")
+
+        md5 = hashlib.md5()
+        with open(self.path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                md5.update(chunk)
+
+        stat = os.stat(self.path)
+        self.generation = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.md5_hash = base64.b64encode(md5.digest()).decode("ascii")
+
+    def download_to_filename(self, filename, **kwargs):
+        self.bucket.simulate_request()
+        if not os.path.isfile(self.path):
+            raise _not_found(f"No such object: {self.bucket.name}/{self.name}")
+        shutil.copyfile(self.path, filename)
+
+    def download_as_bytes(self, **kwargs):
+        self.bucket.simulate_request()
+        if not os.path.isfile(self.path):
+            raise _not_found(f"No such object: {self.bucket.name}/{self.name}")
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.bucket.simulate_request()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        part_path = f"{self.path}.{uuid.uuid4().hex}.part"
+        with open(part_path, "wb") as f:
+            f.write(data)
+        os.replace(part_path, self.path)
+        self._load_metadata()
+
+    def upload_from_file(self, file_obj, content_type=None, **kwargs):
+        self.upload_from_string(file_obj.read(), content_type=content_type)
+
+    def upload_from_filename(self, filename, content_type=None, **kwargs):
+        with open(filename, "rb") as f:
+            self.upload_from_string(f.read(), content_type=content_type)
+
+    def delete(self, **kwargs):
+        self.bucket.simulate_request()
+        if not os.path.isfile(self.path):
+            raise _not_found(f"No such object: {self.bucket.name}/{self.name}")
+        os.unlink(self.path)
+
+
+class LocalBucket:
+    # latency (seconds) and failure_rate (0-1, raised as ServiceUnavailable) are added to every
+    # request, so storage concurrency and retry settings can be tuned offline.
+    def __init__(self, root, name="local-bucket", latency=0.0, failure_rate=0.0):
+        self.root = root
+        self.name = name
+        self.latency = latency
+        self.failure_rate = failure_rate
+        os.makedirs(self.root, exist_ok=True)
+
+    def simulate_request(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            from google.api_core.exceptions import ServiceUnavailable
+            raise ServiceUnavailable("Simulated local storage failure")
+
+    def blob(self, name):
+        return LocalBlob(self, name)
+
+    def get_blob(self, name):
+        blob = self.blob(name)
+        if not blob.exists():
+            return None
+        blob._load_metadata()
+        return blob
+
+    def list_blobs(self, prefix="", **kwargs):
+        self.simulate_request()
+        for dir_path, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith(".part"):
+                    continue
+                name = os.path.relpath(os.path.join(dir_path, filename), self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    blob = self.blob(name)
+                    blob._load_metadata()
+                    yield blob
+
+
+class MemorySnapshot:
+    def __init__(self, doc_id, data, reference):
+        self.id = doc_id
+        self._data = data
+        self.reference = reference
+        self.exists = data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        return (self._data or {}).get(field)
+
+
+ChangeType = enum.Enum("ChangeType", "ADDED REMOVED MODIFIED")
+
+
+class MemoryChange:
+    def __init__(self, change_type, document):
+        self.type = change_type
+        self.document = document
+
+
+class MemoryWatch:
+    # Mirrors the on_snapshot watch handle: callback(snapshots, changes, read_time) on every change
+    def __init__(self, query, callback):
+        self.query = query
+        self.callback = callback
+        self.last = {}
+        self.active = True
+        self._lock = threading.Lock()
+
+    @property
+    def is_active(self):
+        return self.active
+
+    def unsubscribe(self):
+        self.active = False
+        with self.query.collection.db.lock:
+            if self in self.query.collection.db.watches:
+                self.query.collection.db.watches.remove(self)
+
+    def emit(self):
+        with self._lock:
+            snapshots = self.query.get()
+            current = {snapshot.id: snapshot for snapshot in snapshots}
+            changes = []
+            for doc_id, snapshot in current.items():
+                if doc_id not in self.last:
+                    changes.append(MemoryChange(ChangeType.ADDED, snapshot))
+                elif snapshot.to_dict() != self.last[doc_id].to_dict():
+                    changes.append(MemoryChange(ChangeType.MODIFIED, snapshot))
+            for doc_id, snapshot in self.last.items():
+                if doc_id not in current:
+                    changes.append(MemoryChange(ChangeType.REMOVED, snapshot))
+
+            first = not self.last and not changes
+            self.last = current
+            if (changes or first) and self.active:
+                self.callback(snapshots, changes, datetime.now(timezone.utc))
+
+
+class MemoryDocument:
+    def __init__(self, collection, doc_id):
+        self.collection = collection
+        self.id = doc_id
+
+    def get(self):
+        with self.collection.db.lock:
+            data = self.collection.docs.get(self.id)
+            return MemorySnapshot(self.id, copy.deepcopy(data), self)
+
+    def set(self, data, merge=False):
+        with self.collection.db.lock:
+            values = self.collection.db.resolve(data)
+            if merge and self.id in self.collection.docs:
+                self.collection.docs[self.id].update(values)
+            else:
+                self.collection.docs[self.id] = values
+        self.collection.db.notify(self.collection.name)
+
+    def update(self, data):
+        with self.collection.db.lock:
+            if self.id not in self.collection.docs:
+                raise _not_found(f"No document to update: {self.collection.name}/{self.id}")
+            self.collection.docs[self.id].update(self.collection.db.resolve(data))
+        self.collection.db.notify(self.collection.name)
+
+    def delete(self):
+        with self.collection.db.lock:
+            self.collection.docs.pop(self.id, None)
+        self.collection.db.notify(self.collection.name)
+
+
+class MemoryQuery:
+    OPERATORS = {
+        "==": lambda a, b: a == b,
+        "!=": lambda a, b: a != b,
+        "<": lambda a, b: a is not None and a < b,
+        "<=": lambda a, b: a is not None and a <= b,
+        ">": lambda a, b: a is not None and a > b,
+        ">=": lambda a, b: a is not None and a >= b,
+        "in": lambda a, b: a in b,
+    }
+
+    def __init__(self, collection, filters=()):
+        self.collection = collection
+        self.filters = list(filters)
+
+    def where(self, field, op, value):
+        return MemoryQuery(self.collection, self.filters + [(field, self.OPERATORS[op], value)])
+
+    def matches(self, data):
+        return all(op(data.get(field), value) for field, op, value in self.filters)
+
+    def stream(self):
+        with self.collection.db.lock:
+            docs = [(doc_id, copy.deepcopy(data)) for doc_id, data in self.collection.docs.items()
+                    if self.matches(data)]
+        for doc_id, data in docs:
+            yield MemorySnapshot(doc_id, data, self.collection.document(doc_id))
+
+    def get(self):
+        return list(self.stream())
+
+    def on_snapshot(self, callback):
+        watch = MemoryWatch(self, callback)
+        with self.collection.db.lock:
+            self.collection.db.watches.append(watch)
+        watch.emit()
+        return watch
+
+
+class MemoryCollection(MemoryQuery):
+    def __init__(self, db, name):
+        self.db = db
+        self.name = name
+        self.docs = db.collections.setdefault(name, {})
+        super().__init__(self)
+
+    def document(self, doc_id=None):
+        return MemoryDocument(self, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, data):
+        reference = self.document()
+        reference.set(data)
+        return datetime.now(timezone.utc), reference
+
+
+class MemoryBatch:
+    # Applies all queued writes under the store lock, or none if an update target is missing
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, reference, data, merge=False):
+        self.writes.append(("set", reference, data, merge))
+
+    def update(self, reference, data):
+        self.writes.append(("update", reference, data, False))
+
+    def delete(self, reference):
+        self.writes.append(("delete", reference, None, False))
+
+    def commit(self):
+        with self.db.lock:
+            for operation, reference, _, _ in self.writes:
+                if operation == "update" and reference.id not in reference.collection.docs:
+                    raise _not_found(f"No document to update: {reference.collection.name}/{reference.id}")
+
+            for operation, reference, data, merge in self.writes:
+                docs = reference.collection.docs
+                if operation == "delete":
+                    docs.pop(reference.id, None)
+                elif operation == "update" or (merge and reference.id in docs):
+                    docs[reference.id].update(self.db.resolve(data))
+                else:
+                    docs[reference.id] = self.db.resolve(data)
+
+        for name in {reference.collection.name for _, reference, _, _ in self.writes}:
+            self.db.notify(name)
+        return []
+
+
+class MemoryFirestore:
+    def __init__(self):
+        self.collections = {}
+        self.watches = []
+        self.lock = threading.RLock()
+
+    def notify(self, collection_name):
+        # Listeners run synchronously after the write, outside the store lock
+        with self.lock:
+            watches = [watch for watch in self.watches if watch.query.collection.name == collection_name]
+        for watch in watches:
+            watch.emit()
+
+    def collection(self, name):
+        with self.lock:
+            return MemoryCollection(self, name)
+
+    def batch(self):
+        return MemoryBatch(self)
+
+    @staticmethod
+    def resolve(data):
+        values = copy.deepcopy(dict(data))
+        for key, value in values.items():
+            # firestore.SERVER_TIMESTAMP and friends are Sentinel instances
+            if type(value).__name__ == "Sentinel":
+                values[key] = datetime.now(timezone.utc)
+        return values
+
+
+class LocalAuth:
+    # Any password is accepted; admin access is still decided by the admin email list
+    def sign_in_with_email_and_password(self, email, password):
+        return {"email": email, "idToken": base64.urlsafe_b64encode(email.encode("utf-8")).decode("ascii")}
+
+    def get_account_info(self, id_token):
+        email = base64.urlsafe_b64decode(id_token.encode("ascii")).decode("utf-8")
+        return {"users": [{"email": email}]}
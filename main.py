@@ -1,18 +1,11 @@
-import time
-import os
-from datetime import datetime
 import streamlit as st
-from firebase_config import auth, rt_db, bucket, firestore_db
-from firebase_admin import firestore
-import pycountry
-import fitz
-from PIL import Image
-from cross_plat import EditTextFile
-from merge_pdf import Merger
-from dotenv import load_dotenv
-from proposal_module import proposal_session
-from streamlit_sortables import sort_items
-from admin_module import render_upload_tab, render_template_management_tab
+from firebase_config import get_backend
+from workspace import get_workspace_manager
+from document_types import DOCUMENT_DEFINITIONS
+import metrics
+import uuid
+
+# Heavier modules (Firebase clients, pdf2docx, admin UI) are imported where a page first needs them
 
 
 def login():
@@ -22,7 +15,7 @@ def login():
 
     if st.sidebar.button("Login"):
         try:
-            user = auth.sign_in_with_email_and_password(email, password)
+            user = get_backend().auth.sign_in_with_email_and_password(email, password)
             st.session_state.user = user
             st.sidebar.success("Login successful!")
             st.rerun()
@@ -38,16 +31,22 @@ def logout():
 
 
 def admin_panel():
+    from admin_module import render_upload_tab, render_template_management_tab, render_metrics_tab
+
+    bucket = get_backend().bucket
+    firestore_db = get_backend().firestore_db
+
     st.header("📤 Admin Dashboard")
 
     if st.sidebar.button("🚪 Logout"):
         logout()
 
-    tab1, tab2, tab3, tab4 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "📤 Upload Templates",
         "📋 Template Management",
         "📇 Upload Index Templates",
-        "📑 Index Template Management"
+        "📑 Index Template Management",
+        "📈 Metrics"
     ])
 
     with tab1:
@@ -62,6 +61,9 @@ def admin_panel():
     with tab4:
         render_template_management_tab(firestore_db, DOCUMENT_TYPES, bucket, is_index=True)
 
+    with tab5:
+        render_metrics_tab()
+
 
 DOCUMENT_TYPES = [
     "Proposal",
@@ -76,45 +78,60 @@ DOCUMENT_TYPES = [
     "Maintenance Agreement"
 ]
 
-if "document_type" not in st.session_state:
-    st.session_state.document_type = "Proposal"
+page_1_pdf = None
 
 
-if "page" not in st.session_state:
-    st.session_state.page = 1
+def main():
+    if "document_type" not in st.session_state:
+        st.session_state.document_type = "Proposal"
 
-if "user" not in st.session_state:
-    st.session_state.user = None
+    if "page" not in st.session_state:
+        st.session_state.page = 1
 
-page_1_pdf = None
+    if "user" not in st.session_state:
+        st.session_state.user = None
 
+    if "metrics_session_id" not in st.session_state:
+        st.session_state.metrics_session_id = uuid.uuid4().hex[:12]
 
-st.sidebar.title("📑 Document Types")
-st.session_state.document_type = st.sidebar.selectbox("Choose a document type", DOCUMENT_TYPES)
-st.sidebar.title("🔐 Admin Panel")
-is_admin = st.sidebar.checkbox("I'm an admin")
+    # Every rerun gets its own request ID for the spans recorded while it runs
+    metrics.start_request(st.session_state.metrics_session_id)
 
+    # Keeps this session's workspace alive and sweeps the ones abandoned by closed sessions
+    get_workspace_manager().get(st.session_state.metrics_session_id)
 
-if st.session_state.document_type == "Proposal":
-    proposal_session()
+    st.sidebar.title("📑 Document Types")
+    st.session_state.document_type = st.sidebar.selectbox("Choose a document type", DOCUMENT_TYPES)
+    st.sidebar.title("🔐 Admin Panel")
+    is_admin = st.sidebar.checkbox("I'm an admin")
 
-if is_admin:
-    if st.session_state.user:
+    if st.session_state.document_type in DOCUMENT_DEFINITIONS:
+        from proposal_module import document_session
+        document_session(DOCUMENT_DEFINITIONS[st.session_state.document_type])
+    else:
+        st.info(f"{st.session_state.document_type} documents cannot be generated yet.")
 
-        try:
-            user = auth.get_account_info(st.session_state.user['idToken'])
-            email = user['users'][0]['email']
+    if is_admin:
+        if st.session_state.user:
 
-            if email in st.secrets["custom"]["ADMIN_EMAILS"]:
-                admin_panel()
-            else:
-                st.sidebar.error("Not an admin account")
-                logout()
+            try:
+                user = get_backend().auth.get_account_info(st.session_state.user['idToken'])
+                email = user['users'][0]['email']
 
-        except Exception as e:
-            st.sidebar.error(f"Session expired: {str(e)}")
-            logout()
-    else:
-        login()
+                if email in get_backend().admin_emails:
+                    admin_panel()
+                else:
+                    st.sidebar.error("Not an admin account")
+                    logout()
+
+            except Exception as e:
+                st.sidebar.error(f"Session expired: {str(e)}")
+                logout()
+        else:
+            login()
 
 
+# Streamlit runs this script as __main__. Worker processes started with spawn (rasterizer pool,
+# Word export) import it as __mp_main__ and must not run the app.
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,123 @@
-from PyPDF2 import PdfMerger
+from io import BytesIO
 import os
+import time
+import fitz
+
+
+MERGE_BACKENDS = ("fitz", "pypdf2")
 
 
 class Merger:
-    def __init__(self, pdf_paths):
+    def __init__(self, pdf_paths, backend="fitz"):
+        # Each entry may be a path, PDF bytes or an open fitz.Document
+        if backend not in MERGE_BACKENDS:
+            raise ValueError(f"Unknown merge backend: {backend}")
         self.pdf_paths = pdf_paths
+        self.backend = backend
+        self.errors = []
+
+    def merge_pdf_files(self, output_file=None):
+        # Returns the merged PDF as bytes (None on failure); output_file is an optional file sink.
+        # Problems are collected in self.errors as {"source", "stage", "error"} dicts.
+        self.errors = []
+
+        try:
+            if self.backend == "fitz":
+                merged = self._merge_with_fitz()
+            else:
+                merged = self._merge_with_pypdf2()
 
-    def merge_pdf_files(self, output_file):
+            if output_file:
+                with open(output_file, "wb") as f:
+                    f.write(merged)
+            return merged
+        except Exception as e:
+            self._error(None, "write", e)
+            return None
 
+    def _merge_with_fitz(self):
+        merged = fitz.open()
         try:
-            merger = PdfMerger()
+            for index, pdf_path in enumerate(self.pdf_paths):
+                try:
+                    if isinstance(pdf_path, fitz.Document):
+                        merged.insert_pdf(pdf_path)
+                        continue
+
+                    if isinstance(pdf_path, (bytes, bytearray, memoryview)):
+                        source = fitz.open(stream=bytes(pdf_path), filetype="pdf")
+                    elif os.path.exists(pdf_path):
+                        source = fitz.open(pdf_path)
+                    else:
+                        self._error(index, "open", "File not found")
+                        continue
+
+                    with source:
+                        merged.insert_pdf(source)
+                except Exception as e:
+                    self._error(index, "insert", e)
 
-            for pdf_path in self.pdf_paths:
+            # garbage=4 also merges identical streams, so fonts and images shared
+            # between templates are stored once in the output
+            return merged.tobytes(garbage=4, deflate=True)
+        finally:
+            merged.close()
 
-                if os.path.exists(pdf_path):
-                    merger.append(pdf_path)
-                else:
-                    print(f"File not found: {pdf_path}")
+    def _merge_with_pypdf2(self):
+        from PyPDF2 import PdfMerger
 
-            merger.write(output_file)
+        merger = PdfMerger()
+        try:
+            for index, pdf_path in enumerate(self.pdf_paths):
+                try:
+                    if isinstance(pdf_path, fitz.Document):
+                        merger.append(BytesIO(pdf_path.tobytes()))
+                    elif isinstance(pdf_path, (bytes, bytearray, memoryview)):
+                        merger.append(BytesIO(bytes(pdf_path)))
+                    elif os.path.exists(pdf_path):
+                        merger.append(pdf_path)
+                    else:
+                        self._error(index, "open", "File not found")
+                except Exception as e:
+                    self._error(index, "insert", e)
+
+            buffer = BytesIO()
+            merger.write(buffer)
+            return buffer.getvalue()
+        finally:
             merger.close()
-            print(f"Merged PDF saved to {output_file}")
-        except Exception as e:
-            print(f"An error occurred: {e}")
 
+    def _error(self, index, stage, error):
+        if index is None:
+            source = None
+        elif isinstance(self.pdf_paths[index], str):
+            source = self.pdf_paths[index]
+        else:
+            source = f"<in-memory input {index}>"
+        self.errors.append({"source": source, "index": index, "stage": stage, "error": str(error)})
+
+
+def benchmark_backends(pdf_paths, repeat=3):
+    # Best-of-N wall time and output size per backend for the same inputs
+    results = {}
+    for backend in MERGE_BACKENDS:
+        timings = []
+        merger = Merger(pdf_paths, backend=backend)
+        merged = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            merged = merger.merge_pdf_files()
+            timings.append(time.perf_counter() - start)
+        results[backend] = {
+            "seconds": min(timings),
+            "size": len(merged) if merged else 0,
+            "errors": merger.errors
+        }
+    return results
+
+
+if __name__ == "__main__":
+    import sys
 
+    for backend, result in benchmark_backends(sys.argv[1:]).items():
+        print(f"{backend}: {result['seconds'] * 1000:.1f} ms, {result['size']} bytes, {len(result['errors'])} errors")
@@ -0,0 +1,125 @@
+import json
+import math
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+
+# Recent durations kept per stage for the percentile estimates
+MAX_SAMPLES = 2000
+MAX_RECENT_SPANS = 500
+QUANTILES = (0.5, 0.95, 0.99)
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+_totals = defaultdict(lambda: {"count": 0, "sum": 0.0, "errors": 0})
+_recent_spans = deque(maxlen=MAX_RECENT_SPANS)
+_context = threading.local()
+
+
+def start_request(session_id=None):
+    # Called once per script run; spans recorded on this thread are tagged with the returned ID
+    _context.request_id = uuid.uuid4().hex[:12]
+    _context.session_id = session_id
+    return _context.request_id
+
+
+def current_request_id():
+    return getattr(_context, "request_id", None)
+
+
+def current_session_id():
+    return getattr(_context, "session_id", None)
+
+
+def record(stage, seconds, ok=True, request_id=None, session_id=None, **attrs):
+    with _lock:
+        _samples[stage].append(seconds)
+        totals = _totals[stage]
+        totals["count"] += 1
+        totals["sum"] += seconds
+        if not ok:
+            totals["errors"] += 1
+        _recent_spans.append({
+            "stage": stage,
+            "seconds": round(seconds, 4),
+            "ok": ok,
+            "request_id": request_id or current_request_id(),
+            "session_id": session_id or current_session_id(),
+            "at": time.time(),
+            **attrs
+        })
+
+
+@contextmanager
+def span(stage, request_id=None, session_id=None, **attrs):
+    # request_id/session_id are for work handed to other threads, which do not share the caller's context
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, ok, request_id, session_id, **attrs)
+
+
+def _quantile(ordered, q):
+    if not ordered:
+        return None
+    # Nearest-rank percentile
+    index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summary():
+    with _lock:
+        stages = {stage: sorted(samples) for stage, samples in _samples.items()}
+        totals = {stage: dict(values) for stage, values in _totals.items()}
+
+    result = {}
+    for stage, ordered in sorted(stages.items()):
+        result[stage] = {
+            **totals[stage],
+            **{f"p{int(q * 100)}": _quantile(ordered, q) for q in QUANTILES}
+        }
+    return result
+
+
+def recent_spans(limit=100):
+    with _lock:
+        return list(_recent_spans)[-limit:]
+
+
+def to_json():
+    return json.dumps({"stages": summary(), "recent_spans": recent_spans()}, indent=2)
+
+
+def to_prometheus():
+    lines = [
+        "# HELP proposal_stage_seconds Duration of proposal pipeline stages.",
+        "# TYPE proposal_stage_seconds summary"
+    ]
+    errors = []
+    for stage, values in summary().items():
+        for q in QUANTILES:
+            value = values[f"p{int(q * 100)}"]
+            if value is not None:
+                lines.append(f'proposal_stage_seconds{{stage="{stage}",quantile="{q}"}} {value:.6f}')
+        lines.append(f'proposal_stage_seconds_sum{{stage="{stage}"}} {values["sum"]:.6f}')
+        lines.append(f'proposal_stage_seconds_count{{stage="{stage}"}} {values["count"]}')
+        errors.append(f'proposal_stage_errors_total{{stage="{stage}"}} {values["errors"]}')
+
+    lines += ["# HELP proposal_stage_errors_total Stage runs that raised.",
+              "# TYPE proposal_stage_errors_total counter"] + errors
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+        _recent_spans.clear()
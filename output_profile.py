@@ -0,0 +1,101 @@
+import os
+import time
+import fitz
+from cross_plat import pdf_bytes
+import metrics
+
+
+# Steps applied to the final proposal before it is offered for download.
+# image_dpi_threshold / image_dpi: images above the threshold are resampled to image_dpi.
+OUTPUT_PROFILES = {
+    "none": {},
+    "standard": {"garbage": 4, "deflate": True, "object_streams": True},
+    "web": {"garbage": 4, "deflate": True, "object_streams": True, "subset_fonts": True,
+            "image_dpi_threshold": 200, "image_dpi": 150, "image_quality": 80, "linear": True},
+    "small": {"garbage": 4, "deflate": True, "object_streams": True, "subset_fonts": True,
+              "image_dpi_threshold": 120, "image_dpi": 96, "image_quality": 65},
+}
+DEFAULT_PROFILE = os.environ.get("OUTPUT_PROFILE", "standard")
+
+
+def optimize_pdf(pdf, profile=DEFAULT_PROFILE):
+    # Returns (pdf bytes, report). Steps this PyMuPDF build cannot do are listed under "skipped";
+    # when the result would not be smaller the input is returned unchanged.
+    settings = OUTPUT_PROFILES[profile]
+    data = pdf_bytes(pdf)
+    report = {
+        "profile": profile,
+        "bytes_before": len(data),
+        "bytes_after": len(data),
+        "seconds": 0.0,
+        "applied": [],
+        "skipped": []
+    }
+    if not settings:
+        return data, report
+
+    started = time.perf_counter()
+    with metrics.span("optimize", profile=profile, bytes_before=len(data)):
+        doc = fitz.open(stream=data, filetype="pdf")
+        try:
+            if settings.get("subset_fonts"):
+                try:
+                    doc.subset_fonts()
+                    report["applied"].append("subset_fonts")
+                except Exception as e:
+                    report["skipped"].append(f"subset_fonts: {str(e)}")
+
+            if settings.get("image_dpi"):
+                if hasattr(doc, "rewrite_images"):
+                    doc.rewrite_images(dpi_threshold=settings["image_dpi_threshold"],
+                                       dpi_target=settings["image_dpi"],
+                                       quality=settings.get("image_quality", 80))
+                    report["applied"].append(f"images@{settings['image_dpi']}dpi")
+                else:
+                    report["skipped"].append("downsample_images: needs PyMuPDF 1.24 or later")
+
+            save_options = {
+                "garbage": settings.get("garbage", 0),
+                "deflate": settings.get("deflate", False),
+                "deflate_images": settings.get("deflate", False),
+                "deflate_fonts": settings.get("deflate", False),
+            }
+            report["applied"].extend(step for step in ("garbage", "deflate") if settings.get(step))
+
+            output = None
+            if settings.get("linear"):
+                # A linearized file cannot also use object streams
+                try:
+                    output = doc.tobytes(linear=True, **save_options)
+                    report["applied"].append("linear")
+                except Exception as e:
+                    # Recent MuPDF releases dropped linearization
+                    report["skipped"].append(f"linear: {str(e)}")
+            if output is None:
+                if settings.get("object_streams"):
+                    save_options["use_objstms"] = 1
+                    report["applied"].append("object_streams")
+                output = doc.tobytes(**save_options)
+        finally:
+            doc.close()
+
+    if len(output) >= len(data):
+        output = data
+        report["skipped"].append("kept input: optimized output was not smaller")
+
+    report["bytes_after"] = len(output)
+    report["seconds"] = round(time.perf_counter() - started, 4)
+    return output, report
+
+
+def describe(report):
+    # One-line summary for the UI and logs
+    def mb(size):
+        if size < 1024 * 1024:
+            return f"{size / 1024:.0f} KB"
+        return f"{size / (1024 * 1024):.2f} MB"
+
+    saved = report["bytes_before"] - report["bytes_after"]
+    percent = 100 * saved / report["bytes_before"] if report["bytes_before"] else 0
+    return (f"{mb(report['bytes_before'])} → {mb(report['bytes_after'])} ({percent:.0f}% smaller) "
+            f"in {report['seconds'] * 1000:.0f} ms with the '{report['profile']}' profile")
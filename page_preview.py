@@ -0,0 +1,251 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from cross_plat import open_pdf, pdf_bytes
+from render_cache import get_render_cache, content_hash
+from metrics import span
+
+
+PREVIEW_DPI = 150
+# "jpeg" is several times smaller than "png" for image-heavy pages
+PREVIEW_FORMAT = os.environ.get("PREVIEW_FORMAT", "jpeg")
+PREVIEW_JPEG_QUALITY = 80
+PREVIEW_PAGES_PER_VIEW = 5
+SESSION_BUDGET_BYTES = int(os.environ.get("PREVIEW_SESSION_BUDGET_MB", "24")) * 1024 * 1024
+
+# Progressive mode: every page first appears as a low-dpi thumbnail rendered in-process within
+# THUMBNAIL_BUDGET_SECONDS, whatever the document length; full-resolution renders of the pages in
+# view (and thumbnails past the budget) are produced in the background.
+PREVIEW_PROGRESSIVE = os.environ.get("PREVIEW_PROGRESSIVE", "1") == "1"
+THUMBNAIL_DPI = int(os.environ.get("PREVIEW_THUMBNAIL_DPI", "36"))
+THUMBNAIL_BUDGET_SECONDS = float(os.environ.get("PREVIEW_THUMBNAIL_BUDGET_MS", "300")) / 1000
+
+
+def encode_page(page, dpi=PREVIEW_DPI, fmt=PREVIEW_FORMAT, quality=PREVIEW_JPEG_QUALITY):
+    # Pixmap straight to compressed bytes; the raw samples are dropped as soon as this returns
+    pix = page.get_pixmap(dpi=dpi)
+    if fmt == "jpeg":
+        return pix.tobytes("jpeg", jpg_quality=quality)
+    return pix.tobytes(fmt)
+
+
+class BackgroundRenderer:
+    # Renders pages off the script thread into the shared render cache. Jobs are deduplicated by
+    # document, dpi, format and pages, so reruns polling for the same pages queue nothing new.
+    # One worker keeps jobs in submission order; the rasterizer spreads each job over processes.
+    # _jobs only holds running renders; failed ones are remembered in _errors, at most max_errors.
+    def __init__(self, max_workers=1, max_errors=64):
+        self.max_errors = max_errors
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="preview_render")
+        self._jobs = {}
+        self._errors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, data, doc_hash, page_numbers, dpi, fmt):
+        key = (doc_hash, dpi, fmt, tuple(page_numbers))
+        with self._lock:
+            # Failed jobs are not retried, so a page that cannot render does not poll forever
+            if key in self._jobs or key in self._errors:
+                return
+            self._jobs[key] = self._executor.submit(self._run, key, data, doc_hash, list(page_numbers), dpi, fmt)
+
+    def pending(self, doc_hash):
+        with self._lock:
+            return any(key[0] == doc_hash for key in self._jobs)
+
+    def _run(self, key, data, doc_hash, page_numbers, dpi, fmt):
+        try:
+            self._render(data, doc_hash, page_numbers, dpi, fmt)
+        except Exception as e:
+            with self._lock:
+                # Only the message is kept, not the traceback that references the document
+                self._errors[key] = str(e)
+                while len(self._errors) > self.max_errors:
+                    self._errors.popitem(last=False)
+            raise
+        finally:
+            with self._lock:
+                self._jobs.pop(key, None)
+
+    @staticmethod
+    def _render(data, doc_hash, page_numbers, dpi, fmt):
+        from rasterizer import get_rasterizer
+
+        render_cache = get_render_cache()
+        # Another job may have rendered some of these pages meanwhile
+        missing = [number for number in page_numbers if render_cache.get((doc_hash, dpi, fmt, number)) is None]
+        if not missing:
+            return
+        try:
+            images = get_rasterizer().render(data, missing, dpi, fmt)
+        except Exception as e:
+            print(f"Background preview render failed: {str(e)}")
+            raise
+        for number, image in zip(missing, images):
+            render_cache.put((doc_hash, dpi, fmt, number), image)
+
+
+_background_renderer = None
+_background_renderer_lock = threading.Lock()
+
+
+def get_background_renderer():
+    global _background_renderer
+    with _background_renderer_lock:
+        if _background_renderer is None:
+            _background_renderer = BackgroundRenderer()
+        return _background_renderer
+
+
+def thumbnail_deadline():
+    return time.perf_counter() + THUMBNAIL_BUDGET_SECONDS
+
+
+def render_thumbnails(data, doc_hash, page_numbers, fmt=PREVIEW_FORMAT, deadline=None):
+    # {page: thumbnail} for page_numbers, rendered in order until deadline (a perf_counter time,
+    # by default THUMBNAIL_BUDGET_SECONDS from now); the rest is handed to the background renderer
+    # and missing from the result. Callers building one view share a deadline.
+    render_cache = get_render_cache()
+    images = {}
+    missing = []
+    for number in page_numbers:
+        image = render_cache.get((doc_hash, THUMBNAIL_DPI, fmt, number))
+        if image is None:
+            missing.append(number)
+        else:
+            images[number] = image
+
+    if missing:
+        deadline = deadline or thumbnail_deadline()
+        with open_pdf(data) as doc, span("rasterize", pages=len(missing), dpi=THUMBNAIL_DPI, fmt=fmt):
+            for position, number in enumerate(missing):
+                if time.perf_counter() >= deadline:
+                    get_background_renderer().submit(data, doc_hash, missing[position:], THUMBNAIL_DPI, fmt)
+                    break
+                images[number] = encode_page(doc[number], THUMBNAIL_DPI, fmt)
+                render_cache.put((doc_hash, THUMBNAIL_DPI, fmt, number), images[number])
+    return images
+
+
+def progressive_render(data, doc_hash, page_numbers, dpi=PREVIEW_DPI, fmt=PREVIEW_FORMAT, deadline=None,
+                       full=None):
+    # [(image, is_full)] per page without waiting on full-resolution renders: the cached full render
+    # when there is one (full: {page: image} already at hand), otherwise the thumbnail, or None when
+    # neither is ready yet. Missing full renders are queued for the background renderer.
+    render_cache = get_render_cache()
+    full = dict(full or {})
+    for number in page_numbers:
+        if number not in full:
+            image = render_cache.get((doc_hash, dpi, fmt, number))
+            if image is not None:
+                full[number] = image
+
+    waiting = [number for number in page_numbers if number not in full]
+    thumbnails = {}
+    if waiting:
+        # Thumbnails first: a background render started earlier would compete with them for the GIL
+        thumbnails = render_thumbnails(data, doc_hash, waiting, fmt, deadline)
+        get_background_renderer().submit(data, doc_hash, waiting, dpi, fmt)
+    return [(full[number], True) if number in full else (thumbnails.get(number), False)
+            for number in page_numbers]
+
+
+class PagePreview:
+    # One per session: encoded pages of the document being previewed, rendered on demand and
+    # kept in an LRU bounded by budget_bytes. Renders are shared through the process-wide
+    # render cache, so a page another session already rendered costs no rasterization here.
+    def __init__(self, budget_bytes=SESSION_BUDGET_BYTES, dpi=PREVIEW_DPI, fmt=PREVIEW_FORMAT):
+        self.budget_bytes = budget_bytes
+        self.dpi = dpi
+        self.fmt = fmt
+        self.total_bytes = 0
+        self._doc_hash = None
+        self._page_count = 0
+        self._pages = OrderedDict()
+
+    def _use(self, data):
+        doc_hash = content_hash(data)
+        if doc_hash != self._doc_hash:
+            # Only the current document is kept for a session
+            self.clear()
+            self._doc_hash = doc_hash
+            with open_pdf(data) as doc:
+                self._page_count = doc.page_count
+        return doc_hash
+
+    def page_count(self, pdf):
+        self._use(pdf_bytes(pdf))
+        return self._page_count
+
+    def _remember(self, page_number, image):
+        self._pages[page_number] = image
+        self.total_bytes += len(image)
+        while self.total_bytes > self.budget_bytes and len(self._pages) > 1:
+            _, evicted = self._pages.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+    def render(self, pdf, page_numbers):
+        # Returns encoded images for page_numbers (0-based) that exist in the document
+        data = pdf_bytes(pdf)
+        doc_hash = self._use(data)
+        page_numbers = [number for number in page_numbers if 0 <= number < self._page_count]
+        render_cache = get_render_cache()
+
+        images = {}
+        missing = []
+        for number in page_numbers:
+            image = self._pages.get(number)
+            if image is None:
+                image = render_cache.get((doc_hash, self.dpi, self.fmt, number))
+            if image is None:
+                missing.append(number)
+            else:
+                images[number] = image
+
+        if missing:
+            from rasterizer import get_rasterizer
+            rendered = get_rasterizer().render(data, missing, self.dpi, self.fmt)
+            for number, image in zip(missing, rendered):
+                images[number] = image
+                render_cache.put((doc_hash, self.dpi, self.fmt, number), image)
+
+        for number in page_numbers:
+            if number in self._pages:
+                self._pages.move_to_end(number)
+            else:
+                self._remember(number, images[number])
+        return [images[number] for number in page_numbers]
+
+    def render_progressive(self, pdf, page_numbers, deadline=None):
+        # Non-blocking render: [(image, is_full)] as described in progressive_render
+        data = pdf_bytes(pdf)
+        doc_hash = self._use(data)
+        page_numbers = [number for number in page_numbers if 0 <= number < self._page_count]
+
+        held = {number: self._pages[number] for number in page_numbers if number in self._pages}
+        results = progressive_render(data, doc_hash, page_numbers, self.dpi, self.fmt, deadline, full=held)
+        for number, (image, is_full) in zip(page_numbers, results):
+            if number in self._pages:
+                self._pages.move_to_end(number)
+            elif is_full:
+                self._remember(number, image)
+        return results
+
+    def thumbnails(self, pdf, deadline=None):
+        # A thumbnail (or None while it is still queued) for every page of the document
+        data = pdf_bytes(pdf)
+        doc_hash = self._use(data)
+        images = render_thumbnails(data, doc_hash, range(self._page_count), self.fmt, deadline)
+        return [images.get(number) for number in range(self._page_count)]
+
+    def pending(self):
+        # Whether background renders of the current document are still running
+        return self._doc_hash is not None and get_background_renderer().pending(self._doc_hash)
+
+    def clear(self):
+        self._pages.clear()
+        self.total_bytes = 0
+        self._doc_hash = None
+        self._page_count = 0
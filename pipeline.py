@@ -0,0 +1,85 @@
+import hashlib
+from collections import OrderedDict
+from metrics import span
+
+
+def fingerprint(value):
+    # Stable identity for stage inputs: bytes by content, containers element-wise, the rest by repr.
+    # Template paths are content-addressed by the template cache, so a path stands for its bytes.
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "sha256:" + hashlib.sha256(bytes(value)).hexdigest()
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{fingerprint(k)}:{fingerprint(v)}" for k, v in sorted(value.items(), key=repr)) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(fingerprint(item) for item in value) + "]"
+    return repr(value)
+
+
+class Stage:
+    # func is called with each name in inputs (external inputs or earlier stages' artifacts) and
+    # each name in uses (context that is passed through but not part of the memo key).
+    def __init__(self, name, func, inputs=(), uses=(), memoize=True, span_name=None, version=1):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.uses = tuple(uses)
+        self.memoize = memoize
+        self.span_name = span_name
+        self.version = version
+
+
+class Pipeline:
+    def __init__(self, name, stages):
+        self.name = name
+        self.stages = OrderedDict()
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage {stage.name} in {name} pipeline")
+            self.stages[stage.name] = stage
+
+    def run(self, target, inputs, memo, context=None):
+        # Returns the target stage's artifact, re-running only the stages whose inputs changed.
+        # memo ({stage: (key, artifact)}) is updated in place and normally lives in the session;
+        # artifacts of stages with memoize=False are only kept for this run.
+        context = context or {}
+        keys = {}
+        artifacts = {}
+
+        def resolve(name, trail=()):
+            if name in keys:
+                return keys[name]
+            if name not in self.stages:
+                if name not in inputs:
+                    raise KeyError(f"{self.name} pipeline needs input {name!r}")
+                keys[name] = fingerprint(inputs[name])
+                return keys[name]
+            if name in trail:
+                raise ValueError(f"Cycle in {self.name} pipeline: {' -> '.join(trail + (name,))}")
+
+            stage = self.stages[name]
+            dependency_keys = [resolve(dependency, trail + (name,)) for dependency in stage.inputs]
+            key = hashlib.sha256(repr((stage.name, stage.version, dependency_keys)).encode("utf-8")).hexdigest()
+
+            cached = memo.get(name)
+            if stage.memoize and cached is not None and cached[0] == key:
+                artifacts[name] = cached[1]
+            else:
+                arguments = {dependency: inputs[dependency] if dependency not in self.stages else artifacts[dependency]
+                             for dependency in stage.inputs}
+                arguments.update({used: context[used] for used in stage.uses})
+                if stage.span_name:
+                    with span(stage.span_name, pipeline=self.name):
+                        artifact = stage.func(**arguments)
+                else:
+                    artifact = stage.func(**arguments)
+                artifacts[name] = artifact
+                if stage.memoize:
+                    memo[name] = (key, artifact)
+                else:
+                    memo.pop(name, None)
+
+            keys[name] = key
+            return key
+
+        resolve(target)
+        return artifacts[target]
@@ -1,48 +1,113 @@
-import time
-import os
-from datetime import datetime
 import streamlit as st
-import pycountry
-import fitz
 from PIL import Image
-from cross_plat import EditTextFile
+from cross_plat import EditTextFile, open_pdf, pdf_bytes
 from merge_pdf import Merger
-from firebase_config import auth, rt_db, bucket, firestore_db
-import tempfile
-import os
-import uuid
-from pdf2docx import Converter
+from template_cache import get_template_cache
+from template_metadata import get_template_metadata
+from template_forms import current_form_path
+from output_profile import optimize_pdf, describe as describe_optimization
+from render_cache import get_render_cache, content_hash
+from page_preview import (PagePreview, encode_page, progressive_render, thumbnail_deadline, PREVIEW_PAGES_PER_VIEW,
+                          PREVIEW_DPI, PREVIEW_FORMAT, PREVIEW_PROGRESSIVE)
+from rasterizer import get_rasterizer
+from metrics import span, current_request_id, current_session_id
+from pipeline import Pipeline, Stage
+from storage_client import get_storage
+
+
+def convert_pdf_to_word(pdf_path, output_path=None, multi_processing=False):
+    # Returns the DOCX as bytes; output_path is an optional file sink.
+    from docx_export import pdf_to_docx_bytes
 
-
-def convert_pdf_to_word(pdf_path, output_path):
     try:
 
-        cv = Converter(pdf_path)
+        docx = pdf_to_docx_bytes(pdf_path, multi_processing=multi_processing)
 
-        cv.convert(
-            output_path,
-            start=0,
-            end=None,
-            multi_processing=False,
-            cpu_count=2
-        )
-        cv.close()
+        if output_path:
+            with open(output_path, "wb") as f:
+                f.write(docx)
+        return docx
 
     except Exception as e:
         print(f"Failed to convert PDF to Word: {str(e)}")
-        return False
+        return None
+
+
+def word_export_status(pdf_file):
+    # (job key, status) of this session's Word export for pdf_file; a job started for another
+    # PDF (before the user went back and changed something) does not count
+    from docx_export import get_docx_exporter
+
+    key = st.session_state.get("docx_job_key")
+    if key != content_hash(pdf_file):
+        return None, None
+    return key, get_docx_exporter().status(key)
+
+
+def render_word_download(pdf_file, poll=False, prepare=None, file_stem="proposal"):
+    # prepare() starts the conversion and returns its job key; defaults to submitting pdf_file
+    from docx_export import get_docx_exporter
+
+    exporter = get_docx_exporter()
+    key, status = word_export_status(pdf_file)
+
+    if poll and status != "running":
+        # Leave the polling fragment once the background job has finished
+        st.rerun()
+
+    if status == "done":
+        st.download_button(
+            label="Download as Word",
+            data=exporter.result(key),
+            file_name=f"{file_stem}.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+    elif status == "running":
+        st.button("⏳ Preparing Word...", disabled=True, key="docx_preparing")
+        if not poll:
+            st.button("Check again", key="docx_check")
+    else:
+        if status == "failed":
+            st.error(f"Word conversion failed: {exporter.error(key)}")
+        if st.button("Prepare Word document", key="docx_prepare"):
+            st.session_state.docx_job_key = prepare() if prepare else exporter.submit(pdf_file)
+            st.rerun()
+
+
+def _fetch_templates(bucket, prefix, entries, concurrent=True):
+    # Returns (order, filename, path, error) per entry; errors are reported by the caller
+    # because Streamlit elements cannot be created from worker threads.
+    request_id, session_id = current_request_id(), current_session_id()
+
+    def fetch(filename):
+        with span("storage.fetch", request_id=request_id, session_id=session_id, blob=f"{prefix}{filename}"):
+            return get_template_cache().fetch(bucket.blob(f"{prefix}{filename}"))
+
+    results = []
+    if not concurrent or len(entries) < 2:
+        for order, filename in entries:
+            try:
+                results.append((order, filename, fetch(filename), None))
+            except Exception as e:
+                results.append((order, filename, None, e))
+        return results
 
+    # Downloads share the storage client's pool, which bounds concurrency across sessions
+    for (order, filename), path, error in get_storage(bucket).map(lambda entry: fetch(entry[1]), entries):
+        results.append((order, filename, path, error))
+    return results
+
+
+def fetch_index_templates(bucket, firestore_db, doc_type="Proposal", concurrent=True):
+    from google.api_core.exceptions import NotFound
 
-def fetch_index_templates(bucket, firestore_db, doc_type="Proposal"):
     try:
 
-        templates_ref = firestore_db.collection("index_templates").where("doc_type", "==", doc_type)
-        templates = templates_ref.stream()
+        templates = get_template_metadata(firestore_db).get("index_templates", doc_type)
 
-        downloaded_files = {}
+        entries = []
 
-        for doc in templates:
-            data = doc.to_dict()
+        for doc_id, data in templates:
             filename = data.get("filename")
             order = data.get("order", 0)
             visible = data.get("visible", True)
@@ -50,21 +115,17 @@ def fetch_index_templates(bucket, firestore_db, doc_type="Proposal"):
             if not visible or not filename:
                 continue
 
-            try:
+            entries.append((order, filename))
 
-                blob = bucket.blob(f"index_templates/{filename}")
-                if not blob.exists():
-                    st.warning(f"File not found in storage: {filename}")
-                    continue
-
-                temp_filename = f"index_order_{order}_{uuid.uuid4().hex}.pdf"
-                temp_path = os.path.join(tempfile.gettempdir(), temp_filename)
-                blob.download_to_filename(temp_path)
-                downloaded_files[order] = temp_path
+        downloaded_files = {}
 
-            except Exception as e:
-                st.error(f"Failed to download {filename}: {str(e)}")
-                continue
+        for order, filename, path, error in _fetch_templates(bucket, "index_templates/", entries, concurrent):
+            if isinstance(error, NotFound):
+                st.warning(f"File not found in storage: {filename}")
+            elif error:
+                st.error(f"Failed to download {filename}: {str(error)}")
+            else:
+                downloaded_files[order] = path
 
         return [downloaded_files[key] for key in sorted(downloaded_files.keys())]
 
@@ -73,70 +134,142 @@ def fetch_index_templates(bucket, firestore_db, doc_type="Proposal"):
         return []
 
 
-def fetch_proposal_templates(bucket, firestore_db):
+def fetch_proposal_templates(bucket, firestore_db, concurrent=True, with_anchors=False):
+    return fetch_document_templates(bucket, firestore_db, "Proposal", concurrent, with_anchors)
+
+
+def fetch_document_templates(bucket, firestore_db, doc_type, concurrent=True, with_anchors=False):
+    # with_anchors=True returns (paths, anchor_maps) with the stored field anchors aligned to paths.
+    # The first template is the one filled; when it has a compiled form that is fetched instead,
+    # and EditTextFile fills it directly. The rest are merged as uploaded.
+    from google.api_core.exceptions import NotFound
+
     try:
 
-        templates_ref = firestore_db.collection("templates").where("doc_type", "==", "Proposal")
-        templates = templates_ref.stream()
+        templates = get_template_metadata(firestore_db).get("templates", doc_type)
 
-        downloaded_files = {}
+        entries = []
+        originals = {}
+        anchors = {}
+        forms = {}
 
-        for doc in templates:
-            data = doc.to_dict()
+        for doc_id, data in templates:
             filename = data.get("filename")
             order = data.get("order", 0)
 
             if not filename:
                 continue
 
-            blob = bucket.blob(f"pdf_templates/{filename}")
-            temp_filename = f"template_order_{order}_{uuid.uuid4().hex}.pdf"
-            temp_path = os.path.join(tempfile.gettempdir(), temp_filename)
+            originals[order] = f"pdf_templates/{filename}"
+            forms[order] = current_form_path(data)
+            anchors[order] = data.get("anchors")
 
-            blob.download_to_filename(temp_path)
-            downloaded_files[order] = temp_path
+        for order in originals:
+            use_form = order == min(originals) and forms[order]
+            entries.append((order, forms[order] if use_form else originals[order]))
 
-        return [downloaded_files[key] for key in sorted(downloaded_files.keys())]
+        downloaded_files = {}
+
+        for order, blob_name, path, error in _fetch_templates(bucket, "", entries, concurrent):
+            if isinstance(error, NotFound) and blob_name != originals[order]:
+                # A missing form falls back to the original template
+                _, _, path, error = _fetch_templates(bucket, "", [(order, originals[order])])[0]
+            if error:
+                raise error
+            downloaded_files[order] = path
+
+        paths = [downloaded_files[key] for key in sorted(downloaded_files.keys())]
+        if with_anchors:
+            return paths, [anchors[key] for key in sorted(downloaded_files.keys())]
+        return paths
 
     except Exception as e:
-        st.error(f"Failed to download proposal templates: {e}")
-        return []
+        st.error(f"Failed to download {doc_type.lower()} templates: {e}")
+        return ([], []) if with_anchors else []
 
 
 def get_pdf_preview(file_path):
-    doc = fitz.open(file_path)
-    page = doc[0]
-    pixmap = page.get_pixmap()
-    image = Image.frombytes("RGB", [pixmap.width, pixmap.height], pixmap.samples)
-    return image
+    # Encoded PNG of the first page
+    doc = open_pdf(file_path)
+    return encode_page(doc[0], dpi=72, fmt="png")
 
 
-def render_all_pdf_pages(pdf_path):
-    images = []
+def render_all_pdf_pages(pdf_path, dpi=150, as_bytes=False, progressive=False):
+    # as_bytes=True returns PNG bytes per page, served from the shared render cache when possible.
+    # progressive=True returns PNG bytes at once: full renders that are ready, thumbnails for the
+    # rest (None past the thumbnail budget) while the full renders complete in the background.
     try:
-        doc = fitz.open(pdf_path)
-        for page in doc:
-            pix = page.get_pixmap(dpi=150)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            images.append(img)
-        return images
+        data = pdf_bytes(pdf_path)
+        if progressive:
+            with open_pdf(data) as doc:
+                page_count = doc.page_count
+            return [image for image, _ in progressive_render(data, content_hash(data), range(page_count), dpi, "png")]
+
+        if as_bytes:
+            key = (content_hash(data), dpi)
+            cached = get_render_cache().get(key)
+            if cached is not None:
+                return cached
+
+        with open_pdf(data) as doc:
+            page_count = doc.page_count
+        rendered = get_rasterizer().render(data, range(page_count), dpi, "png" if as_bytes else "raw")
+
+        if as_bytes:
+            get_render_cache().put(key, rendered)
+            return rendered
+        return [Image.frombytes("RGB", [width, height], samples) for width, height, samples in rendered]
     except Exception as e:
         st.error(f"Error rendering PDF: {e}")
         return []
 
 
-def get_merged_pdf_preview(file_path, page_num=3):
+def get_merged_pdf_preview(file_path, page_num=3, progressive=False):
+    # progressive=True returns the page's thumbnail until its full render is ready
     try:
-        doc = fitz.open(file_path)
-        page = doc[page_num]
-        pix = page.get_pixmap(dpi=150)
-        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-        return img
+        if progressive:
+            data = pdf_bytes(file_path)
+            return progressive_render(data, content_hash(data), [page_num])[0][0]
+        return get_rasterizer().render(file_path, [page_num], PREVIEW_DPI, PREVIEW_FORMAT)[0]
     except Exception as e:
         st.error(f"Failed to load PDF: {e}")
         return None
 
 
+PREVIEW_POLL_SECONDS = 0.5
+THUMBNAIL_WIDTH = 110
+
+
+def render_progressive_preview(run, page_preview, preview, poll=False):
+    # The pages in view at full resolution, standing in their thumbnails until the background
+    # renders land, followed by every page as a thumbnail. Polls while renders are pending; the
+    # fragment's first call comes in the script run that just built preview, so it does not refresh.
+    if poll and not st.session_state.pop("preview_fresh", False):
+        preview = run("preview")
+        if not page_preview.pending():
+            # Leave the polling fragment; the full rerun shows the finished renders
+            st.rerun()
+
+    for number, (image, is_full) in zip(range(preview["start"], preview["end"]), preview["images"]):
+        if image is None:
+            st.caption(f"Page {number + 1} is being rendered…")
+        else:
+            caption = f"Page {number + 1}" if is_full else f"Page {number + 1} (loading full resolution…)"
+            st.image(image, caption=caption, use_container_width=True)
+
+    thumbnails = preview["thumbnails"]
+    ready = [(number, image) for number, image in enumerate(thumbnails) if image is not None]
+    with st.expander(f"All {len(thumbnails)} pages", expanded=len(thumbnails) > PREVIEW_PAGES_PER_VIEW):
+        if ready:
+            st.image([image for _, image in ready], caption=[f"Page {number + 1}" for number, _ in ready],
+                     width=THUMBNAIL_WIDTH)
+        if len(ready) < len(thumbnails):
+            st.caption(f"{len(thumbnails) - len(ready)} more pages are being rendered…")
+
+    if not poll and page_preview.pending() and not hasattr(st, "fragment"):
+        st.button("Refresh preview", key="preview_refresh")
+
+
 def next_page():
     st.session_state.page += 1
     st.rerun()
@@ -147,65 +280,167 @@ def prev_page():
     st.rerun()
 
 
-def proposal_session():
-    if "proposal_templates" not in st.session_state:
-        st.session_state.proposal_templates = fetch_proposal_templates(bucket, firestore_db)
+def build_pipeline(document_type):
+    # fetch → fill → select index → merge → render → export; each stage re-runs only when
+    # something upstream of it changed
+    def templates(bucket, firestore_db, doc_type, templates_version):
+        return fetch_document_templates(bucket, firestore_db, doc_type, with_anchors=True)
 
-    if "proposal_index_templates" not in st.session_state:
-        st.session_state.proposal_index_templates = fetch_index_templates(bucket, firestore_db, doc_type="Proposal")
+    def index_templates(bucket, firestore_db, doc_type, index_templates_version):
+        return fetch_index_templates(bucket, firestore_db, doc_type=doc_type)
+
+    def fill(templates, fields):
+        paths, anchors = templates
+        filled = EditTextFile(paths[0]).modify_pdf_fields(
+            None, document_type.modifications(fields), document_type.y_offset, anchors=anchors[0]
+        )
+        # modify_pdf_fields reports failures by returning None; raising fails the span and keeps it out of the memo
+        if filled is None:
+            raise RuntimeError(f"Filling the first {document_type.name.lower()} page failed")
+        return filled
+
+    def select_index(index_templates, index_choice):
+        if not index_templates:
+            return None
+        return index_templates[min(index_choice, len(index_templates) - 1)]
+
+    def merge(fill, select_index, templates):
+        file_list = [fill, *([select_index] if select_index else []), *templates[0][document_type.body_start:]]
+        merger = Merger(file_list)
+        with span("merge", inputs=len(file_list), backend=merger.backend):
+            merged_pdf = merger.merge_pdf_files()
+
+        optimize_report = None
+        if merged_pdf:
+            try:
+                merged_pdf, optimize_report = optimize_pdf(merged_pdf)
+            except Exception as e:
+                print(f"Output optimization failed, serving the merged PDF as is: {e}")
+        return {"pdf": merged_pdf, "errors": merger.errors, "optimize_report": optimize_report}
+
+    def window(merge, preview_start, page_preview, render_pages):
+        page_count = page_preview.page_count(merge["pdf"]) if merge["pdf"] else 0
+        if not page_count:
+            return {"page_count": 0, "start": 0, "end": 0, "images": []}
+        start = min(preview_start, (page_count - 1) // PREVIEW_PAGES_PER_VIEW * PREVIEW_PAGES_PER_VIEW)
+        end = min(start + PREVIEW_PAGES_PER_VIEW, page_count)
+        return {"page_count": page_count, "start": start, "end": end,
+                "images": render_pages(merge["pdf"], range(start, end))}
+
+    def render(merge, preview_start, page_preview):
+        # Pages are rendered a window at a time into the session's bounded preview store
+        return window(merge, preview_start, page_preview, page_preview.render)
+
+    def preview(merge, preview_start, page_preview):
+        # Progressive counterpart of render: (image, is_full) pairs for the window plus a thumbnail of
+        # every page, all within one thumbnail budget; improves as background renders land
+        deadline = thumbnail_deadline()
+        result = window(merge, preview_start, page_preview,
+                        lambda pdf, page_numbers: page_preview.render_progressive(pdf, page_numbers, deadline))
+        result["thumbnails"] = page_preview.thumbnails(merge["pdf"], deadline) if result["page_count"] else []
+        return result
+
+    def export(merge):
+        from docx_export import get_docx_exporter
+        return get_docx_exporter().submit(merge["pdf"])
+
+    return Pipeline(document_type.name, [
+        Stage("templates", templates, inputs=("doc_type", "templates_version"),
+              uses=("bucket", "firestore_db"), span_name="template_fetch"),
+        Stage("index_templates", index_templates, inputs=("doc_type", "index_templates_version"),
+              uses=("bucket", "firestore_db"), span_name="template_fetch"),
+        Stage("fill", fill, inputs=("templates", "fields"), span_name="fill"),
+        Stage("select_index", select_index, inputs=("index_templates", "index_choice")),
+        Stage("merge", merge, inputs=("fill", "select_index", "templates")),
+        Stage("render", render, inputs=("merge", "preview_start"), uses=("page_preview",)),
+        # Progressive results change as background renders complete, so they are never memoized
+        Stage("preview", preview, inputs=("merge", "preview_start"), uses=("page_preview",), memoize=False),
+        # The exporter deduplicates by content and may evict results, so always ask it
+        Stage("export", export, inputs=("merge",), memoize=False)
+    ])
+
+
+def _render_fields_form(document_type, previous):
+    values = {}
+    for key, label, kind in document_type.fields:
+        if kind == "country":
+            import pycountry
+            countries = sorted([country.name for country in pycountry.countries])
+            index = countries.index(previous[key]) if previous.get(key) in countries else 0
+            values[key] = st.selectbox(label, countries, index=index)
+        elif kind == "date":
+            values[key] = st.date_input(label, value=previous.get(key, "today"))
+        else:
+            values[key] = st.text_input(label, value=previous.get(key, ""))
+    return values
+
+
+def document_session(document_type):
+    # Resolved here so the PDF helpers above can be used without Firebase credentials
+    from firebase_config import get_backend
+    bucket = get_backend().bucket
+    firestore_db = get_backend().firestore_db
+    doc_type = document_type.name
+
+    # Stage artifacts are memoized per session and document type
+    pipelines = st.session_state.setdefault("pipelines", {})
+    if doc_type not in pipelines:
+        pipelines[doc_type] = (build_pipeline(document_type), {"doc_type": doc_type, "index_choice": 0,
+                                                               "preview_start": 0}, {})
+    pipeline, inputs, memo = pipelines[doc_type]
+
+    if "page_preview" not in st.session_state:
+        st.session_state.page_preview = PagePreview()
+    context = {"bucket": bucket, "firestore_db": firestore_db, "page_preview": st.session_state.page_preview}
+
+    # Template lists are refetched whenever an admin change reaches the shared metadata cache
+    metadata = get_template_metadata(firestore_db)
+    inputs["templates_version"] = metadata.version("templates", doc_type)
+    inputs["index_templates_version"] = metadata.version("index_templates", doc_type)
+
+    # Template paths memoized by earlier reruns must outlive the cache's eviction while the session is in use
+    if "templates" in memo:
+        get_template_cache().keep(memo["templates"][1][0])
+    if "index_templates" in memo:
+        get_template_cache().keep(memo["index_templates"][1])
+
+    def run(stage):
+        return pipeline.run(stage, inputs, memo, context)
 
     if st.session_state.page == 1:
-        st.title("Proposal PDF Generator")
-        if not st.session_state.proposal_templates:
-            st.warning("No Proposal templates found!")
+        st.title(document_type.title)
+        if not run("templates")[0]:
+            st.warning(f"No {doc_type} templates found!")
         else:
             with st.form("Get Started"):
-                name = st.text_input("Name")
-                email = st.text_input("Email")
-                phone = st.text_input("Phone")
-                countries = sorted([country.name for country in pycountry.countries])
-                country = st.selectbox("Select Country", countries)
-                date = st.date_input("Date")
+                values = _render_fields_form(document_type, inputs.get("fields", {}))
                 submitted = st.form_submit_button("Next")
                 if submitted:
-                    formatted_date = date.strftime("%d %B %Y")
-
-                    input_pdf = st.session_state.proposal_templates[0]
-                    output_pdf = os.path.join(tempfile.gettempdir(), f"page1_filled_{uuid.uuid4().hex}.pdf")
-                    pdf_editor = EditTextFile(input_pdf)
-
-                    modifications = {
-                        "Name:": f": {name}",
-                        "Email:": f": {email}",
-                        "Phone": f": {phone}",
-                        "Country": f": {country}",
-                        "14 April 2025": f"{formatted_date}"
-                    }
-                    pdf_editor.modify_pdf_fields(output_pdf, modifications, 8)
-                    st.session_state.filled_page1 = output_pdf
-                    next_page()
+                    inputs["fields"] = values
+                    inputs["preview_start"] = 0
+                    try:
+                        run("fill")
+                    except Exception as e:
+                        st.error(f"Could not fill in your details: {e}")
+                    else:
+                        next_page()
 
     elif st.session_state.page == 2:
         st.title("Select Index Page Style")
-        if not st.session_state.proposal_index_templates:
+        index_templates = run("index_templates")
+        if not index_templates:
             st.warning("No index templates found!")
         else:
-            template_options = {}
-            for file in st.session_state.proposal_index_templates:
-                filename = os.path.basename(file)
-                order = filename.split('_')[2]
-                display_name = f"Template {order}"
-                template_options[display_name] = file
-
-            selected_display = st.selectbox("Choose your Template", list(template_options.keys()))
-            selected_pdf = template_options[selected_display]
-            st.session_state.filled_page2 = selected_pdf
-
-            if selected_pdf:
-                st.image(get_pdf_preview(selected_pdf))
-                st.write(f"You selected {selected_display}")
-            else:
-                st.write("No index Template available")
+            # Cached template paths are content-addressed, so the label comes from the sorted position
+            labels = [f"Template {order}" for order in range(1, len(index_templates) + 1)]
+            choice = labels.index(st.selectbox("Choose your Template", labels,
+                                               index=min(inputs["index_choice"], len(index_templates) - 1)))
+            if choice != inputs["index_choice"]:
+                inputs["index_choice"] = choice
+                inputs["preview_start"] = 0
+
+            st.image(get_pdf_preview(index_templates[choice]))
+            st.write(f"You selected {labels[choice]}")
 
         col1, col2, col3 = st.columns([1, 8, 1])
         with col1:
@@ -216,27 +451,54 @@ def proposal_session():
                 next_page()
 
     elif st.session_state.page == 3:
-
-        file_list = [
-            st.session_state.filled_page1,
-            st.session_state.filled_page2,
-            *st.session_state.proposal_templates[2:]
-        ]
-
-        rino_p = Merger(file_list)
-        pdf_file = "merged(1-6)_preview.pdf"
-        rino_p.merge_pdf_files(pdf_file)
-        st.title("📄 Full Proposal Preview")
-
-        all_pages = render_all_pdf_pages(pdf_file)
-        word_file = "proposal.docx"
-        conversion_success = convert_pdf_to_word(pdf_file, word_file)
-
-        if all_pages:
-            # for i, img in enumerate(all_pages):
-            #     st.image(img, caption=f"Page {i + 1}", use_column_width=True)
-            st.image(all_pages, use_container_width=True)
-            # use_container_width = True
+        try:
+            merged = run("merge")
+        except Exception as e:
+            st.error(f"Could not build the {doc_type.lower()}: {e}")
+            merged = {"pdf": None, "errors": [], "optimize_report": None}
+        pdf_file = merged["pdf"]
+        st.title(document_type.preview_title)
+
+        for error in merged["errors"]:
+            st.warning(f"Could not merge {error['source'] or doc_type.lower()} ({error['stage']}): {error['error']}")
+
+        if merged["optimize_report"]:
+            st.caption(f"Download size: {describe_optimization(merged['optimize_report'])}")
+
+        try:
+            # Without a merged PDF the preview stages would only hit the same failure again
+            preview = run("preview" if PREVIEW_PROGRESSIVE else "render") if pdf_file else {"page_count": 0}
+        except Exception as e:
+            st.error(f"Error rendering PDF: {e}")
+            preview = {"page_count": 0}
+
+        if preview["page_count"]:
+            start, end, page_count = preview["start"], preview["end"], preview["page_count"]
+            if page_count > PREVIEW_PAGES_PER_VIEW:
+                nav1, nav2, nav3 = st.columns([1, 3, 1])
+                with nav1:
+                    if st.button("◀ Earlier pages", disabled=start == 0):
+                        inputs["preview_start"] = max(start - PREVIEW_PAGES_PER_VIEW, 0)
+                        st.rerun()
+                with nav2:
+                    st.caption(f"Pages {start + 1}–{end} of {page_count}")
+                with nav3:
+                    if st.button("Later pages ▶", disabled=end >= page_count):
+                        inputs["preview_start"] = start + PREVIEW_PAGES_PER_VIEW
+                        st.rerun()
+
+            if PREVIEW_PROGRESSIVE:
+                page_preview = st.session_state.page_preview
+                if page_preview.pending() and hasattr(st, "fragment"):
+                    st.session_state.preview_fresh = True
+                    st.fragment(run_every=PREVIEW_POLL_SECONDS)(render_progressive_preview)(
+                        run, page_preview, preview, poll=True
+                    )
+                else:
+                    render_progressive_preview(run, page_preview, preview)
+            else:
+                st.image(preview["images"], caption=[f"Page {number + 1}" for number in range(start, end)],
+                         use_container_width=True)
         else:
             st.warning("No pages found or unable to render PDF.")
 
@@ -245,21 +507,26 @@ def proposal_session():
             if st.button("Previous"):
                 prev_page()
         with col3:
-            # if conversion_success:
-            with open(word_file, "rb") as f:
-                st.download_button(
-                    label="Download as Word",
-                    data=f,
-                    file_name="proposal.docx",
-                    mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-                )
+            if pdf_file:
+                prepare = lambda: run("export")
+                # Same check the fragment makes, so it is only entered for a job it will keep polling
+                _, docx_status = word_export_status(pdf_file)
+                if docx_status == "running" and hasattr(st, "fragment"):
+                    st.fragment(run_every=1.0)(render_word_download)(
+                        pdf_file, poll=True, prepare=prepare, file_stem=document_type.file_stem
+                    )
+                else:
+                    render_word_download(pdf_file, prepare=prepare, file_stem=document_type.file_stem)
         with col4:
-            with open(pdf_file, "rb") as f:
+            if pdf_file:
                 st.download_button(
                     label="Download as PDF",
-                    data=f,
-                    file_name="proposal.pdf",
+                    data=pdf_file,
+                    file_name=f"{document_type.file_stem}.pdf",
                     mime="application/pdf"
                 )
 
 
+def proposal_session():
+    from document_types import DOCUMENT_DEFINITIONS
+    document_session(DOCUMENT_DEFINITIONS["Proposal"])
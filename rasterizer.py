@@ -0,0 +1,122 @@
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cross_plat import open_pdf, pdf_bytes
+from render_cache import content_hash
+from metrics import span
+
+
+# Rendering holds the GIL, so threads cannot spread it over cores; long documents are split
+# into contiguous page ranges rendered by a process pool. Short jobs stay in-process, where
+# they finish before the documents could be shipped to the workers.
+RASTER_WORKERS = int(os.environ.get("RASTER_WORKERS", str(os.cpu_count() or 1)))
+RASTER_MIN_PARALLEL_PAGES = int(os.environ.get("RASTER_MIN_PARALLEL_PAGES", "4"))
+# Fewer pages than this per range and the per-task overhead outweighs the split
+RASTER_MIN_PAGES_PER_WORKER = 2
+
+# Worker side: the last document opened, so a worker handed more ranges of the same
+# document (the next preview window, another range of this job) does not parse it again.
+_worker_document = None
+
+
+def _open_cached(doc_hash, data):
+    global _worker_document
+    if _worker_document is None or _worker_document[0] != doc_hash:
+        if _worker_document is not None:
+            _worker_document[1].close()
+        _worker_document = (doc_hash, open_pdf(data))
+    return _worker_document[1]
+
+
+def render_pages(doc, page_numbers, dpi, fmt, quality=None):
+    # fmt "raw" returns (width, height, RGB samples) for callers that build PIL images
+    from page_preview import encode_page, PREVIEW_JPEG_QUALITY
+
+    images = []
+    for number in page_numbers:
+        if fmt == "raw":
+            pix = doc[number].get_pixmap(dpi=dpi)
+            images.append((pix.width, pix.height, pix.samples))
+        else:
+            images.append(encode_page(doc[number], dpi, fmt, quality or PREVIEW_JPEG_QUALITY))
+    return images
+
+
+def _render_range(doc_hash, data, page_numbers, dpi, fmt, quality):
+    return render_pages(_open_cached(doc_hash, data), page_numbers, dpi, fmt, quality)
+
+
+def split_ranges(page_numbers, workers, min_per_worker=RASTER_MIN_PAGES_PER_WORKER):
+    # Contiguous, order-preserving chunks, at most one per worker
+    count = max(1, min(workers, len(page_numbers) // max(1, min_per_worker)))
+    size = math.ceil(len(page_numbers) / count)
+    return [page_numbers[start:start + size] for start in range(0, len(page_numbers), size)]
+
+
+class Rasterizer:
+    def __init__(self, workers=RASTER_WORKERS, min_parallel_pages=RASTER_MIN_PARALLEL_PAGES):
+        self.workers = workers
+        self.min_parallel_pages = min_parallel_pages
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a process that runs Streamlit's threads is not safe
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _reset_pool(self, pool):
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False)
+
+    def render(self, pdf, page_numbers, dpi, fmt, quality=None):
+        # Returns one image per entry of page_numbers (0-based), in the same order
+        data = pdf_bytes(pdf)
+        page_numbers = list(page_numbers)
+        # Raw pixels are several times larger than the page and cost more to ship back than to render
+        parallel = self.workers > 1 and len(page_numbers) >= self.min_parallel_pages and fmt != "raw"
+
+        with span("rasterize", pages=len(page_numbers), dpi=dpi, fmt=fmt,
+                  workers=self.workers if parallel else 1):
+            if parallel:
+                pool = self._get_pool()
+                try:
+                    doc_hash = content_hash(data)
+                    futures = [pool.submit(_render_range, doc_hash, data, chunk, dpi, fmt, quality)
+                               for chunk in split_ranges(page_numbers, self.workers)]
+                    return [image for future in futures for image in future.result()]
+                except BrokenProcessPool as e:
+                    # A worker died (out of memory, killed); render here and start a fresh pool next time
+                    print(f"Rasterizer pool failed, rendering in-process: {str(e)}")
+                    self._reset_pool(pool)
+
+            with open_pdf(data) as doc:
+                return render_pages(doc, page_numbers, dpi, fmt, quality)
+
+    def shutdown(self):
+        # Needed before exit when this process is itself a multiprocessing child: its exit joins
+        # child processes before the executor's exit hook would stop the pool workers
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+
+_rasterizer = None
+_rasterizer_lock = threading.Lock()
+
+
+def get_rasterizer():
+    global _rasterizer
+    with _rasterizer_lock:
+        if _rasterizer is None:
+            _rasterizer = Rasterizer()
+        return _rasterizer
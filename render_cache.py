@@ -0,0 +1,64 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+DEFAULT_MAX_BYTES = int(os.environ.get("RENDER_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _size(images):
+    # Entries are either one encoded image or a list of them
+    if isinstance(images, bytes):
+        return len(images)
+    return sum(len(image) for image in images)
+
+
+class RenderCache:
+    # Process-wide LRU of encoded page images keyed by (document hash, dpi) for whole
+    # documents or (document hash, dpi, format, page) for single pages, bounded by the
+    # total size of the stored bytes.
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            images = self._entries.get(key)
+            if images is not None:
+                self._entries.move_to_end(key)
+            return images
+
+    def put(self, key, images):
+        size = _size(images)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= _size(self._entries.pop(key))
+
+            self._entries[key] = images
+            self.total_bytes += size
+
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= _size(evicted)
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache():
+    global _render_cache
+    with _render_cache_lock:
+        if _render_cache is None:
+            _render_cache = RenderCache()
+        return _render_cache
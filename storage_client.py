@@ -0,0 +1,165 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+
+
+# Every storage call in the app goes through a StorageClient: a per-call timeout, bounded
+# retries with jittered exponential backoff for transient errors, and one shared worker pool
+# for concurrent transfers. Works with the Firebase bucket and local_backend.LocalBucket alike.
+STORAGE_MAX_WORKERS = int(os.environ.get("STORAGE_MAX_WORKERS", "8"))
+# Seconds; applies to each HTTP request, not to the whole transfer
+STORAGE_TIMEOUT = float(os.environ.get("STORAGE_TIMEOUT", "60"))
+STORAGE_RETRIES = int(os.environ.get("STORAGE_RETRIES", "3"))
+STORAGE_BACKOFF = float(os.environ.get("STORAGE_BACKOFF", "0.5"))
+STORAGE_MAX_BACKOFF = 8.0
+# Kept at least as large as the worker pool so concurrent transfers reuse connections
+STORAGE_POOL_SIZE = max(STORAGE_MAX_WORKERS, int(os.environ.get("STORAGE_POOL_SIZE", "16")))
+# google-cloud-storage sends uploads up to this size as a single multipart request whatever the
+# blob's chunk_size; only larger ones become resumable, chunked uploads
+MULTIPART_MAX_BYTES = 8 * 1024 * 1024
+
+
+def is_transient(error):
+    from google.api_core import exceptions
+
+    if isinstance(error, (exceptions.TooManyRequests, exceptions.InternalServerError, exceptions.BadGateway,
+                          exceptions.ServiceUnavailable, exceptions.GatewayTimeout)):
+        return True
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    try:
+        import requests
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+    except ImportError:
+        return False
+
+
+def pool_http_connections(client, size=STORAGE_POOL_SIZE):
+    # google-cloud-storage sends every request through one requests session per client, whose
+    # default pool keeps 10 connections; workers beyond that would reconnect on every call.
+    try:
+        from requests.adapters import HTTPAdapter
+        client._http.mount("https://", HTTPAdapter(pool_connections=size, pool_maxsize=size))
+    except Exception as e:
+        print(f"Could not resize the storage connection pool: {str(e)}")
+
+
+class StorageClient:
+    def __init__(self, bucket, max_workers=STORAGE_MAX_WORKERS, timeout=STORAGE_TIMEOUT, retries=STORAGE_RETRIES,
+                 backoff=STORAGE_BACKOFF):
+        self.bucket = bucket
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def blob(self, blob_or_name):
+        return self.bucket.blob(blob_or_name) if isinstance(blob_or_name, str) else blob_or_name
+
+    def call(self, blob, method, *args, **kwargs):
+        # The client library's own retry is turned off so the policy here is the only one.
+        # Only for calls that send or fetch everything in one request; see upload_bytes.
+        return self._retry(method, blob.name,
+                           lambda: getattr(blob, method)(*args, timeout=self.timeout, retry=None, **kwargs))
+
+    def _retry(self, method, name, attempt_call):
+        # A retried call starts over from scratch
+        attempt = 0
+        while True:
+            try:
+                return attempt_call()
+            except Exception as e:
+                if attempt >= self.retries or not is_transient(e):
+                    raise
+                delay = min(STORAGE_MAX_BACKOFF, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+                metrics.record("storage.retry", delay, ok=False, method=method, blob=name, error=str(e))
+                print(f"Retrying {method} on {name} in {delay:.1f}s after: {str(e)}")
+                time.sleep(delay)
+                attempt += 1
+
+    def reload(self, blob_or_name):
+        blob = self.blob(blob_or_name)
+        self.call(blob, "reload")
+        return blob
+
+    def exists(self, blob_or_name):
+        return self.call(self.blob(blob_or_name), "exists")
+
+    def download_to_filename(self, blob_or_name, filename):
+        blob = self.blob(blob_or_name)
+        self.call(blob, "download_to_filename", filename)
+        return blob
+
+    def download_bytes(self, blob_or_name):
+        return self.call(self.blob(blob_or_name), "download_as_bytes")
+
+    def upload_bytes(self, blob_or_name, data, content_type=None, **kwargs):
+        # Returns the blob, whose generation and md5_hash describe what was stored
+        blob = self.blob(blob_or_name)
+        if getattr(blob, "chunk_size", None) and len(data) > MULTIPART_MAX_BYTES:
+            # Resumable upload: the client library retries each failed chunk, where a retry here
+            # would restart the whole file, so its default retry policy is kept
+            blob.upload_from_string(data, content_type=content_type, timeout=self.timeout, **kwargs)
+        else:
+            self.call(blob, "upload_from_string", data, content_type=content_type, **kwargs)
+        return blob
+
+    def upload_file(self, blob_or_name, file_obj, content_type=None, **kwargs):
+        # Read once so a retry does not resume from wherever the failed attempt left the stream
+        file_obj.seek(0)
+        return self.upload_bytes(blob_or_name, file_obj.read(), content_type=content_type, **kwargs)
+
+    def delete(self, blob_or_name, missing_ok=True):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.call(self.blob(blob_or_name), "delete")
+        except NotFound:
+            if not missing_ok:
+                raise
+
+    def list_blobs(self, prefix=""):
+        # Materialized inside the retry so a failure never leaves a half-consumed page iterator
+        return self._retry("list_blobs", prefix, lambda: list(
+            self.bucket.list_blobs(prefix=prefix, timeout=self.timeout, retry=None)
+        ))
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="storage")
+            return self._executor
+
+    def submit(self, func, *args, **kwargs):
+        # Runs func on the shared storage pool. func must not wait on other storage futures,
+        # since a full pool would then deadlock.
+        return self.executor().submit(func, *args, **kwargs)
+
+    def map(self, func, items):
+        # Returns [(item, result, error)] in input order; one failure does not cancel the rest
+        futures = [(item, self.submit(func, item)) for item in items]
+        results = []
+        for item, future in futures:
+            try:
+                results.append((item, future.result(), None))
+            except Exception as e:
+                results.append((item, None, e))
+        return results
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_storage(bucket):
+    # One client (and worker pool) per bucket for the whole process
+    with _clients_lock:
+        client = _clients.get(id(bucket))
+        if client is None or client.bucket is not bucket:
+            client = _clients[id(bucket)] = StorageClient(bucket)
+        return client
@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+from storage_client import get_storage
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "proposal_template_cache")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("TEMPLATE_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Entries used more recently than this are never evicted. Sessions touch the paths they
+# hold on every rerun (see keep), so a live session does not lose its files.
+DEFAULT_MIN_AGE = 60 * 60
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        while True:
+            self.handle = open(self.path, "a+b")
+            if not fcntl:
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_LOCK, 1)
+                return self
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX)
+            # Eviction may have unlinked the file while we waited; that lock no longer excludes anyone
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self.handle.fileno()).st_ino:
+                    return self
+            except FileNotFoundError:
+                pass
+            self.handle.close()
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if fcntl:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+            else:
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.handle.close()
+
+
+class TemplateCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, min_age=DEFAULT_MIN_AGE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.min_age = min_age
+        self._local_lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def cache_key(blob):
+        identity = f"{blob.name}:{blob.generation}:{blob.md5_hash}"
+        return hashlib.sha256(identity.encode("utf-8")).hexdigest()
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pdf")
+
+    def lock_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.lock")
+
+    def keep(self, paths):
+        # Marks paths a session still holds as recently used, so eviction leaves them alone
+        for path in paths:
+            if path and os.path.dirname(path) == self.cache_dir:
+                self._touch(path)
+
+    def fetch(self, blob):
+        # Metadata round trip only; raises NotFound when the blob is missing.
+        storage = get_storage(blob.bucket)
+        storage.reload(blob)
+
+        key = self.cache_key(blob)
+        path = self.path_for(key)
+
+        if self._touch(path):
+            return path
+
+        with _FileLock(self.lock_path(key)):
+            # Another session or worker may have finished the download while we waited.
+            if self._touch(path):
+                return path
+
+            part_path = f"{path}.{uuid.uuid4().hex}.part"
+            try:
+                storage.download_to_filename(blob, part_path)
+                self._verify(part_path, blob)
+                os.replace(part_path, path)
+            finally:
+                if os.path.exists(part_path):
+                    os.unlink(part_path)
+
+        self.evict()
+        return path
+
+    def evict(self):
+        with self._local_lock, _FileLock(os.path.join(self.cache_dir, "evict.lock")):
+            entries = []
+            locks = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".lock") and name != "evict.lock":
+                    locks.append(name[:-len(".lock")])
+                if not name.endswith(".pdf"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+
+            now = time.time()
+            cached = set()
+            evicted = set()
+            for mtime, size, name in sorted(entries):
+                key = name[:-len(".pdf")]
+                if total <= self.max_bytes or now - mtime < self.min_age:
+                    cached.add(key)
+                    continue
+                try:
+                    os.unlink(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+                evicted.add(key)
+                total -= size
+
+            # Lock files go with their entry, and with downloads that failed long ago
+            for key in locks:
+                if key in evicted or (key not in cached and self._is_stale(self.lock_path(key), now)):
+                    self._remove_lock(key)
+
+    def _is_stale(self, path, now):
+        try:
+            return now - os.stat(path).st_mtime >= self.min_age
+        except FileNotFoundError:
+            return False
+
+    def _remove_lock(self, key):
+        path = self.lock_path(key)
+        try:
+            with _FileLock(path):
+                # Unlinked while held, so a fetch waiting on it retries with a fresh file
+                if not os.path.exists(self.path_for(key)):
+                    os.unlink(path)
+        except OSError:
+            # Windows cannot unlink a file another process has open; it goes on a later pass
+            pass
+
+    @staticmethod
+    def _touch(path):
+        # mtime doubles as the LRU timestamp; atime is unreliable on noatime mounts.
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _verify(path, blob):
+        if not blob.md5_hash:
+            return
+
+        md5 = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                md5.update(chunk)
+
+        if base64.b64encode(md5.digest()).decode("ascii") != blob.md5_hash:
+            raise IOError(f"Checksum mismatch while caching {blob.name}")
+
+
+_template_cache = None
+
+
+def get_template_cache():
+    global _template_cache
+    if _template_cache is None:
+        _template_cache = TemplateCache()
+    return _template_cache
@@ -0,0 +1,31 @@
+from cross_plat import compile_form, FORM_VERSION
+from storage_client import get_storage
+import metrics
+
+
+FORM_PREFIX = "forms/"
+
+
+def form_path(template_blob_name):
+    return f"{FORM_PREFIX}{template_blob_name}"
+
+
+def store_form(bucket, template_blob_name, pdf):
+    # Compiles the template's labelled fields into widgets and uploads the result next to it.
+    # Returns the fields to save on the template record; {} when no field was found.
+    with metrics.span("form_compile", blob=template_blob_name):
+        compiled, field_count = compile_form(pdf)
+    if compiled is None:
+        return {}
+
+    path = form_path(template_blob_name)
+    with metrics.span("storage.upload", blob=path):
+        get_storage(bucket).upload_bytes(path, compiled, content_type="application/pdf")
+    return {"form_path": path, "form_version": FORM_VERSION, "form_fields": field_count}
+
+
+def current_form_path(record):
+    # The compiled template to fill for a record, or None to fill the original
+    if record.get("form_path") and record.get("form_version") == FORM_VERSION:
+        return record["form_path"]
+    return None
@@ -0,0 +1,158 @@
+import copy
+import os
+import threading
+import time
+
+
+# "listen" keeps each (collection, doc_type) fresh through a Firestore snapshot listener;
+# "poll" re-queries once the entry is older than TEMPLATE_METADATA_TTL seconds.
+DEFAULT_MODE = os.environ.get("TEMPLATE_METADATA_MODE", "listen")
+DEFAULT_TTL = float(os.environ.get("TEMPLATE_METADATA_TTL", "15"))
+
+# How long the first snapshot may take before a call falls back to a direct query
+LISTENER_START_TIMEOUT = 5
+
+
+class _Entry:
+    def __init__(self):
+        self.docs = None
+        self.version = 0
+        self.loaded_at = 0
+        self.watch = None
+        self.ready = threading.Event()
+        self.resubscribing = False
+
+
+class TemplateMetadataCache:
+    # Process-wide view of template records per (collection, doc_type), shared by all sessions
+    def __init__(self, firestore_db, mode=DEFAULT_MODE, ttl=DEFAULT_TTL):
+        self.firestore_db = firestore_db
+        self.mode = mode
+        self.ttl = ttl
+        self._entries = {}
+        # Versions of invalidated entries, so a recreated entry never reports a version already seen
+        self._retired_versions = {}
+        self._lock = threading.RLock()
+
+    def _query(self, collection, doc_type):
+        return self.firestore_db.collection(collection).where("doc_type", "==", doc_type)
+
+    def _replace(self, entry, docs):
+        # Bumps the version only when something actually changed
+        with self._lock:
+            if docs != entry.docs:
+                entry.docs = docs
+                entry.version += 1
+            entry.loaded_at = time.time()
+
+    def _load(self, collection, doc_type):
+        return {doc.id: doc.to_dict() or {} for doc in self._query(collection, doc_type).stream()}
+
+    def _listen(self, collection, doc_type, entry):
+        def on_snapshot(snapshots, changes, read_time):
+            self._replace(entry, {doc.id: doc.to_dict() or {} for doc in snapshots})
+            entry.ready.set()
+
+        try:
+            entry.watch = self._query(collection, doc_type).on_snapshot(on_snapshot)
+        except Exception as e:
+            print(f"Snapshot listener unavailable for {collection}/{doc_type}, polling instead: {e}")
+            entry.watch = None
+            return False
+        return entry.ready.wait(LISTENER_START_TIMEOUT)
+
+    def _resubscribe(self, collection, doc_type, entry):
+        with self._lock:
+            if entry.resubscribing:
+                return False
+            entry.resubscribing = True
+            watch, entry.watch = entry.watch, None
+            entry.ready.clear()
+        try:
+            if watch is not None:
+                try:
+                    watch.unsubscribe()
+                except Exception as e:
+                    print(f"Closing the snapshot listener for {collection}/{doc_type} failed: {e}")
+            return self._listen(collection, doc_type, entry)
+        finally:
+            entry.resubscribing = False
+
+    def _entry(self, collection, doc_type):
+        key = (collection, doc_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+                entry.version = self._retired_versions.pop(key, 0)
+                start_listener = self.mode == "listen"
+            else:
+                start_listener = False
+
+        if start_listener and self._listen(collection, doc_type, entry):
+            return entry
+
+        if entry.watch is not None and entry.ready.is_set():
+            if not getattr(entry.watch, "is_active", True):
+                print(f"Snapshot listener for {collection}/{doc_type} stopped, re-subscribing")
+                if self._resubscribe(collection, doc_type, entry):
+                    return entry
+            elif time.time() - entry.loaded_at > self.ttl:
+                # Firestore sends nothing while a query is quiet, so a listener that silently stopped
+                # delivering looks the same as an idle one; check it against a direct query once per TTL
+                docs = self._load(collection, doc_type)
+                missed = docs != entry.docs
+                self._replace(entry, docs)
+                if missed:
+                    print(f"Snapshot listener for {collection}/{doc_type} missed changes, re-subscribing")
+                    self._resubscribe(collection, doc_type, entry)
+                return entry
+            else:
+                return entry
+
+        if entry.watch is None or not entry.ready.is_set():
+            if entry.docs is None or time.time() - entry.loaded_at > self.ttl:
+                self._replace(entry, self._load(collection, doc_type))
+        return entry
+
+    def get(self, collection, doc_type):
+        # Returns [(doc_id, data)] with private copies of the data
+        entry = self._entry(collection, doc_type)
+        with self._lock:
+            return [(doc_id, copy.deepcopy(data)) for doc_id, data in entry.docs.items()]
+
+    def version(self, collection, doc_type):
+        return self._entry(collection, doc_type).version
+
+    def invalidate(self, collection, doc_type=None):
+        # For writers in this process: drops the matching entries, listeners included, so the next
+        # read queries (or re-subscribes) afresh instead of trusting a listener that may be behind
+        with self._lock:
+            dropped = [(key, entry) for key, entry in self._entries.items()
+                       if key[0] == collection and doc_type in (None, key[1])]
+            for key, entry in dropped:
+                del self._entries[key]
+                self._retired_versions[key] = entry.version
+        for _, entry in dropped:
+            if entry.watch is not None:
+                entry.watch.unsubscribe()
+
+    def close(self):
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries = {}
+        for entry in entries:
+            if entry.watch is not None:
+                entry.watch.unsubscribe()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_template_metadata(firestore_db):
+    with _caches_lock:
+        cache = _caches.get(id(firestore_db))
+        if cache is None or cache.firestore_db is not firestore_db:
+            cache = _caches[id(firestore_db)] = TemplateMetadataCache(firestore_db)
+        return cache
@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from cross_plat import discover_anchors
+from thumbnail_store import get_thumbnail_store
+from firestore_batch import commit_writes, delete_blobs
+from template_forms import store_form
+from storage_client import get_storage
+import metrics
+
+
+UPLOAD_MAX_WORKERS = 4
+# Files larger than storage_client.MULTIPART_MAX_BYTES are uploaded resumably in chunks of
+# this size, retried per chunk by the client library; smaller ones go up in one request under
+# the StorageClient retry policy. Must be a multiple of 256 KB.
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Upper bound on the uncompressed size of an uploaded zip
+MAX_ZIP_BYTES = 500 * 1024 * 1024
+
+
+def md5_base64(data):
+    # Same encoding as blob.md5_hash
+    return base64.b64encode(hashlib.md5(data).digest()).decode("ascii")
+
+
+def collect_pdfs(uploaded_files):
+    # Expands zips; returns [(name, bytes)] in upload order, zip members sorted by path
+    pdfs, skipped = [], []
+    for uploaded_file in uploaded_files:
+        name = uploaded_file.name
+        if name.lower().endswith(".zip"):
+            try:
+                with zipfile.ZipFile(io.BytesIO(uploaded_file.getvalue())) as archive:
+                    members = sorted(
+                        (info for info in archive.infolist() if not info.is_dir()),
+                        key=lambda info: info.filename
+                    )
+                    if sum(info.file_size for info in members) > MAX_ZIP_BYTES:
+                        skipped.append({"file": name, "reason": "zip is too large when extracted"})
+                        continue
+                    for info in members:
+                        member_name = os.path.basename(info.filename)
+                        if member_name.startswith(".") or "__MACOSX" in info.filename:
+                            continue
+                        if not member_name.lower().endswith(".pdf"):
+                            skipped.append({"file": f"{name}/{info.filename}", "reason": "not a PDF"})
+                            continue
+                        pdfs.append((member_name, archive.read(info)))
+            except zipfile.BadZipFile as e:
+                skipped.append({"file": name, "reason": f"unreadable zip: {str(e)}"})
+        elif name.lower().endswith(".pdf"):
+            pdfs.append((name, uploaded_file.getvalue()))
+        else:
+            skipped.append({"file": name, "reason": "not a PDF"})
+    return pdfs, skipped
+
+
+def existing_blobs(bucket, prefix):
+    # {blob name: md5_hash} for everything already stored under prefix
+    with metrics.span("storage.list", prefix=prefix):
+        return {blob.name: blob.md5_hash for blob in get_storage(bucket).list_blobs(prefix)}
+
+
+def registered_blobs(firestore_db, collection_name, storage_prefix, doc_type):
+    # Blob names that have a template record; queried directly, since a stale list would let a
+    # file whose record was just deleted be skipped
+    query = firestore_db.collection(collection_name).where("doc_type", "==", doc_type)
+    with metrics.span("firestore.query", collection=collection_name):
+        return {f"{storage_prefix}{(doc.to_dict() or {}).get('filename')}" for doc in query.stream()}
+
+
+def upload_template_file(bucket, blob_name, data, is_index, compile_forms=False):
+    # Uploads one template and prepares its derived data; returns (record fields, warnings).
+    # Shared by the single-file and bulk upload paths.
+    blob = bucket.blob(blob_name)
+    blob.chunk_size = UPLOAD_CHUNK_SIZE
+    with metrics.span("storage.upload", blob=blob_name, bytes=len(data)):
+        get_storage(bucket).upload_bytes(blob, data, content_type="application/pdf", checksum="md5")
+
+    record = {}
+    warnings = []
+    if not is_index:
+        # Index pages are never filled, so only regular templates get an anchor map
+        try:
+            record["anchors"] = discover_anchors(data)
+        except Exception as e:
+            warnings.append(f"anchor discovery failed, fields will be searched at fill time: {str(e)}")
+    if compile_forms and not is_index:
+        try:
+            record.update(store_form(bucket, blob_name, data))
+        except Exception as e:
+            warnings.append(f"form compilation failed, the template will be filled by overlay: {str(e)}")
+    try:
+        record.update(get_thumbnail_store().store(bucket, blob_name, blob.generation, data))
+    except Exception as e:
+        warnings.append(f"thumbnail generation failed, it will be created on first view: {str(e)}")
+    return record, warnings
+
+
+def upload_templates(bucket, firestore_db, collection_name, storage_prefix, doc_type, pdfs, user_email,
+                     start_order, is_index=False, on_progress=None, max_workers=UPLOAD_MAX_WORKERS,
+                     compile_forms=False):
+    # Uploads pdfs ([(name, bytes)]) concurrently, skipping content already stored for this
+    # document type, then writes all template records in one batch. on_progress(result) is
+    # called on the calling thread as each file finishes.
+    from firebase_admin import firestore
+
+    folder = f"{storage_prefix}{doc_type}/"
+    blobs = existing_blobs(bucket, folder)
+    # A blob without a record (left by an upload whose record write failed) is uploaded again
+    registered = registered_blobs(firestore_db, collection_name, storage_prefix, doc_type)
+    stored = {md5: name for name, md5 in blobs.items() if name in registered}
+    taken_names = set(blobs)
+
+    results, pending, seen = [], [], {}
+    for name, data in pdfs:
+        md5 = md5_base64(data)
+        if md5 in stored:
+            result = {"file": name, "status": "skipped", "detail": f"already stored as {stored[md5]}"}
+        elif md5 in seen:
+            result = {"file": name, "status": "skipped", "detail": f"duplicate of {seen[md5]}"}
+        else:
+            seen[md5] = name
+            order = start_order + len(pending)
+            filename = f"template_{order}.pdf"
+            if f"{folder}{filename}" in taken_names:
+                filename = f"template_{order}_{hashlib.md5(data).hexdigest()[:8]}.pdf"
+            taken_names.add(f"{folder}{filename}")
+            result = {"file": name, "status": "pending", "detail": "", "order": order,
+                      "blob": f"{folder}{filename}", "filename": f"{doc_type}/{filename}"}
+            pending.append((result, data))
+        results.append(result)
+        if result["status"] == "skipped" and on_progress:
+            on_progress(result)
+
+    records = []
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+            futures = {
+                executor.submit(upload_template_file, bucket, result["blob"], data, is_index, compile_forms): result
+                for result, data in pending
+            }
+            for future in as_completed(futures):
+                result = futures[future]
+                try:
+                    extra, warnings = future.result()
+                    result["status"] = "uploaded"
+                    result["detail"] = "; ".join(warnings)
+                    record = {
+                        "doc_type": doc_type,
+                        "filename": result["filename"],
+                        "template_name": os.path.splitext(result["file"])[0],
+                        "order": result["order"],
+                        "visible": True,
+                        "uploaded_at": firestore.SERVER_TIMESTAMP,
+                        "uploaded_by": user_email
+                    }
+                    record.update(extra)
+                    records.append((result, record))
+                except Exception as e:
+                    result["status"] = "failed"
+                    result["detail"] = str(e)
+                if on_progress:
+                    on_progress(result)
+
+    collection = firestore_db.collection(collection_name)
+    records.sort(key=lambda item: item[0]["order"])
+    report = commit_writes(firestore_db, [("set", collection.document(), record) for _, record in records])
+
+    if report["error"]:
+        # Without records the blobs would be invisible orphans, so take them back out
+        delete_blobs(bucket, [result["blob"] for result, _ in records]
+                     + [record[field] for _, record in records for field in ("thumbnail_path", "form_path")
+                        if record.get(field)])
+        for result, _ in records:
+            result["status"] = "failed"
+            result["detail"] = f"saving template records failed: {report['error']}"
+
+    report["results"] = results
+    for status in ("uploaded", "skipped", "failed"):
+        report[status] = sum(1 for result in results if result["status"] == status)
+    return report
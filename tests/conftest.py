@@ -0,0 +1,51 @@
+import os
+import sys
+import fitz
+import pytest
+
+# The app is a set of top-level modules run from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import template_cache  # noqa: E402
+from firebase_config import LocalBackend, set_backend  # noqa: E402
+
+
+def template_pdf(pages=1, title="Template"):
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_text((45, 80), "14 April 2025", fontsize=20)
+        page.insert_text((50, 200), "Name:", fontsize=20)
+        page.insert_text((50, 260), "Email:", fontsize=20)
+        page.insert_text((50, 320), "Phone:", fontsize=20)
+        page.insert_text((50, 380), "Country :", fontsize=20)
+        page.insert_text((50, 600), title, fontsize=12)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    backend = LocalBackend(str(tmp_path / "backend"))
+    set_backend(backend)
+    monkeypatch.setattr(template_cache, "_template_cache", template_cache.TemplateCache(str(tmp_path / "cache")))
+    yield backend
+    set_backend(None)
+
+
+@pytest.fixture
+def seeded(backend):
+    db = backend.firestore_db
+    for order, pages in enumerate([1, 1, 2], start=1):
+        backend.bucket.blob(f"pdf_templates/Proposal/template_{order}.pdf").upload_from_string(
+            template_pdf(pages, f"Body {order}"))
+        db.collection("templates").add({"doc_type": "Proposal", "filename": f"Proposal/template_{order}.pdf",
+                                        "template_name": f"template_{order}.pdf", "order": order})
+    for order in (1, 2):
+        backend.bucket.blob(f"index_templates/Proposal/index_{order}.pdf").upload_from_string(
+            template_pdf(1, f"Index {order}"))
+        db.collection("index_templates").add({"doc_type": "Proposal", "filename": f"Proposal/index_{order}.pdf",
+                                              "template_name": f"index_{order}.pdf", "order": order,
+                                              "visible": True})
+    return backend
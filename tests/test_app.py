@@ -0,0 +1,105 @@
+import os
+from concurrent.futures import Future
+import pytest
+import metrics
+from docx_export import get_docx_exporter
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+@pytest.fixture
+def script_runs(monkeypatch):
+    runs = []
+    start_request = metrics.start_request
+
+    def counting(session_id=None):
+        runs.append(session_id)
+        return start_request(session_id)
+
+    monkeypatch.setattr(metrics, "start_request", counting)
+    return runs
+
+
+def open_preview(app):
+    app.run()
+    for field, value in zip(app.text_input, ["Ann Lee", "ann@example.com", "555 0100"]):
+        field.input(value)
+    app.button[0].click().run()
+    [button for button in app.button if button.label == "Next"][0].click().run()
+    assert "📄 Full Proposal Preview" in [title.value for title in app.title]
+
+
+def test_stale_word_export_job_does_not_loop(seeded, script_runs):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(MAIN, default_timeout=60)
+    open_preview(app)
+
+    # A conversion still running for the PDF the session had before it went back and changed a field
+    exporter = get_docx_exporter()
+    exporter._jobs["stale"] = Future()
+    try:
+        app.session_state["docx_job_key"] = "stale"
+        del script_runs[:]
+        app.run()
+    finally:
+        exporter._jobs.pop("stale", None)
+
+    assert not app.exception
+    assert len(script_runs) == 1
+    assert "Prepare Word document" in [button.label for button in app.button]
+
+
+def test_spawned_workers_do_not_run_the_app(seeded):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from streamlit.testing.v1 import AppTest
+
+    # Streamlit leaves main.py registered as __main__, which spawn re-imports in every child
+    AppTest.from_file(MAIN, default_timeout=60).run()
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        assert pool.submit(metrics.current_request_id).result(timeout=60) is None
+
+
+def test_bulk_delete_report_survives_the_rerun(seeded, monkeypatch):
+    import base64
+    from streamlit.testing.v1 import AppTest
+    from local_backend import LocalBlob
+
+    def delete(blob, **kwargs):
+        raise PermissionError(f"cannot delete {blob.name}")
+
+    monkeypatch.setattr(LocalBlob, "delete", delete)
+    monkeypatch.setenv("LOCAL_ADMIN_EMAILS", "admin@example.com")
+    app = AppTest.from_file(MAIN, default_timeout=60)
+    app.session_state["user"] = {"email": "admin@example.com",
+                                 "idToken": base64.urlsafe_b64encode(b"admin@example.com").decode("ascii")}
+    app.run()
+    [box for box in app.checkbox if box.label == "I'm an admin"][0].check().run()
+    [box for box in app.checkbox if box.label == "🗑️ Select for Delete"][0].check().run()
+    [button for button in app.button if button.label == "⚠️ Confirm Delete Selected Templates"][0].click().run()
+
+    assert not app.exception
+    assert "Deleted 1 template." in [success.value for success in app.success]
+    assert any(warning.value.startswith("Could not delete file pdf_templates/Proposal/")
+               for warning in app.warning)
+
+
+def test_polling_preview_builds_the_first_paint_once(seeded, monkeypatch):
+    import proposal_module
+    from page_preview import PagePreview
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(MAIN, default_timeout=60)
+    open_preview(app)
+
+    # Background renders still running, so the preview is drawn by the polling fragment
+    monkeypatch.setattr(PagePreview, "pending", lambda self: True)
+    deadlines = []
+    thumbnail_deadline = proposal_module.thumbnail_deadline
+    monkeypatch.setattr(proposal_module, "thumbnail_deadline",
+                        lambda: deadlines.append(1) or thumbnail_deadline())
+    app.run()
+
+    assert not app.exception
+    assert len(deadlines) == 1
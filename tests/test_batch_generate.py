@@ -0,0 +1,27 @@
+import csv
+import fitz
+from batch_generate import fetch_batch_templates, main
+
+
+def test_batch_generates_one_document_per_row(seeded, tmp_path):
+    csv_path = tmp_path / "rows.csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Email", "Phone", "Country", "Date"])
+        writer.writerow(["Ann Lee", "ann@example.com", "555 0100", "Kenya", "2026-05-01"])
+        writer.writerow(["Bo Chen", "bo@example.com", "555 0101", "Chile", "1 June 2026"])
+
+    page1, anchors, index, body = fetch_batch_templates(2, "Proposal")
+    assert len(body) == 1
+
+    output_dir = tmp_path / "out"
+    assert main([str(csv_path), "--index-template", "2", "--output-dir", str(output_dir), "--workers", "1",
+                 "--doc-type", "Proposal"]) == 0
+
+    with open(output_dir / "manifest.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["status"] for row in rows] == ["ok", "ok"]
+    with fitz.open(rows[1]["pdf"]) as doc:
+        assert doc.page_count == 4
+        assert "Bo Chen" in doc[0].get_text() and "01 June 2026" in doc[0].get_text()
+        assert "Index 2" in doc[1].get_text()
@@ -0,0 +1,76 @@
+import fitz
+import pytest
+import docx_export
+from docx_export import DocxExporter
+
+
+def wait(exporter):
+    # One worker runs jobs in order, so this returns once every earlier job has finished
+    exporter._executor.submit(lambda: None).result()
+
+
+def test_failed_conversion_is_reported_once_then_retryable(monkeypatch):
+    calls = []
+
+    def convert(data, **kwargs):
+        calls.append(data)
+        if len(calls) == 1:
+            raise ValueError("broken")
+        return b"docx"
+
+    monkeypatch.setattr(docx_export, "pdf_to_docx_bytes", convert)
+    monkeypatch.setattr(docx_export.fitz, "open", lambda **kwargs: _Doc())
+    exporter = DocxExporter(max_workers=1)
+
+    key = exporter.submit(b"%PDF-1.4")
+    wait(exporter)
+    assert exporter.status(key) == "failed"
+    assert exporter._jobs == {}
+    assert str(exporter.error(key)) == "broken"
+    assert exporter.status(key) is None
+
+    assert exporter.submit(b"%PDF-1.4") == key
+    wait(exporter)
+    assert exporter.status(key) == "done"
+    assert exporter.result(key) == b"docx"
+
+
+def test_failures_are_bounded(monkeypatch):
+    monkeypatch.setattr(docx_export.fitz, "open", lambda **kwargs: (_ for _ in ()).throw(RuntimeError("bad pdf")))
+    exporter = DocxExporter(max_workers=1, max_results=2)
+    keys = [exporter.submit(b"%PDF-" + bytes([number])) for number in range(4)]
+    wait(exporter)
+    assert exporter._jobs == {}
+    assert [exporter.status(key) for key in keys] == [None, None, "failed", "failed"]
+
+
+class _Doc:
+    page_count = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def test_multi_process_conversion_runs_in_a_spawned_process(monkeypatch):
+    import pdf2docx.converter
+
+    started = []
+    real_pool = pdf2docx.converter.Pool
+    monkeypatch.setattr(pdf2docx.converter, "Pool",
+                        lambda *args, **kwargs: started.append(1) or real_pool(*args, **kwargs))
+
+    doc = fitz.open()
+    for number in range(4):
+        doc.new_page().insert_text((50, 100), f"Page {number + 1}", fontsize=20)
+    docx = docx_export.pdf_to_docx_bytes(doc.tobytes(), multi_processing=True, cpu_count=2)
+    assert docx[:2] == b"PK"
+    # The pool was started in the child, never in this (threaded) process
+    assert started == []
+
+
+def test_multi_process_conversion_reports_child_failures():
+    with pytest.raises(RuntimeError, match="Word conversion failed"):
+        docx_export.pdf_to_docx_bytes(b"%PDF-1.4 not really a pdf", multi_processing=True, cpu_count=2)
@@ -0,0 +1,93 @@
+import fitz
+import pytest
+from cross_plat import (EditTextFile, FieldLocator, compile_form, discover_anchors, proposal_modifications,
+                        PROPOSAL_Y_OFFSET)
+
+
+MODIFICATIONS = proposal_modifications("Ann Lee", "ann@example.com", "555 0100", "Kenya", "01 May 2026")
+
+
+def make_pdf(lines):
+    doc = fitz.open()
+    page = doc.new_page()
+    for y, text in lines:
+        page.insert_text((50, y), text, fontsize=20)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+# Labels as real templates carry them: placeholders and punctuation attached, a detached colon
+REALISTIC = make_pdf([(80, "Date: 14 April 2025."), (200, "Name:__________"), (260, "Email:__________"),
+                      (320, "Phone :"), (380, "Country/Region"), (500, "Call our Telephone line")])
+SYNTHETIC = make_pdf([(80, "14 April 2025"), (200, "Name:"), (260, "Email:"), (320, "Phone:"),
+                      (380, "Country :"), (500, "Some other text Telephone here")])
+
+
+def baseline_fill(data, modifications, y_offset):
+    # The fill as it was before FieldLocator: page.search_for over a few spellings of each
+    # label, first hit wins, redacted and written one field at a time
+    doc = fitz.open(stream=data, filetype="pdf")
+    for page in doc:
+        for field, new_value in modifications.items():
+            variations = [field, field.replace(":", ""), field.replace(":", " :"), field.lower(), field.upper(),
+                          field.replace(" ", ""), field.replace(" ", "  ")]
+            for variation in variations:
+                instances = page.search_for(variation)
+                if instances:
+                    area, point = EditTextFile._field_layout(field, instances[0], y_offset)
+                    page.add_redact_annot(area, fill=(1, 1, 1))
+                    page.apply_redactions()
+                    EditTextFile._insert_value(page, point, new_value)
+                    break
+    return doc.tobytes()
+
+
+def words(data):
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return [[(word[4], *(round(value) for value in word[:4])) for word in page.get_text("words")]
+                for page in doc]
+
+
+def locate(data, fields):
+    with fitz.open(stream=data, filetype="pdf") as doc:
+        return FieldLocator(doc[0]).locate(fields)
+
+
+def test_locator_matches_labels_with_attached_placeholders_and_punctuation():
+    found = locate(REALISTIC, ["Name:", "Email:", "Phone", "Country", "14 April 2025"])
+    assert all(rect is not None for rect in found.values())
+    with fitz.open(stream=REALISTIC, filetype="pdf") as doc:
+        page = doc[0]
+        # The rect covers the label and its colon, not the placeholder after it
+        assert tuple(found["Name:"]) == pytest.approx(tuple(page.search_for("Name:")[0]), abs=0.5)
+        assert tuple(found["Country"]) == pytest.approx(tuple(page.search_for("Country")[0]), abs=0.5)
+
+
+def test_locator_requires_a_word_start():
+    found = locate(make_pdf([(100, "Telephone"), (200, "Nicknames:")]), ["Phone", "Name:"])
+    assert found == {"Phone": None, "Name:": None}
+
+
+def test_locator_does_not_end_inside_a_longer_word():
+    assert locate(make_pdf([(100, "Countryside")]), ["Country"]) == {"Country": None}
+
+
+@pytest.mark.parametrize("template", [REALISTIC, SYNTHETIC], ids=["realistic", "synthetic"])
+@pytest.mark.parametrize("path", ["search", "unbatched", "anchors", "form"])
+def test_fill_matches_baseline_output(template, path):
+    expected = words(baseline_fill(template, MODIFICATIONS, PROPOSAL_Y_OFFSET))
+    source, options = template, {}
+    if path == "unbatched":
+        options["batched"] = False
+    elif path == "anchors":
+        options["anchors"] = discover_anchors(template)
+    elif path == "form":
+        source, count = compile_form(template, y_offset=PROPOSAL_Y_OFFSET)
+        assert count == len(MODIFICATIONS)
+
+    filler = EditTextFile(source)
+    filled = filler.modify_pdf_fields(None, MODIFICATIONS, PROPOSAL_Y_OFFSET, **options)
+    assert filler.match_report["missing"] == {}
+    assert filler.match_report["source"] == {"anchors": "anchors", "form": "form"}.get(path, "search")
+    assert words(filled) == expected
@@ -0,0 +1,89 @@
+from datetime import date
+import fitz
+import pytest
+import firebase_config
+from firebase_config import LocalBackend, get_backend, set_backend
+from cross_plat import pdf_bytes
+
+
+def first_page_text(path):
+    # The title line of template_pdf
+    with fitz.open(path) as doc:
+        return doc[0].get_text().strip().splitlines()[-1]
+
+
+def test_login_accepts_any_password_and_checks_admin_list(backend, monkeypatch):
+    monkeypatch.setenv("LOCAL_ADMIN_EMAILS", "admin@example.com, other@example.com")
+    user = get_backend().auth.sign_in_with_email_and_password("admin@example.com", "anything")
+    info = get_backend().auth.get_account_info(user["idToken"])
+    assert info["users"][0]["email"] == "admin@example.com"
+    assert "admin@example.com" in get_backend().admin_emails
+
+    user = get_backend().auth.sign_in_with_email_and_password("guest@example.com", "anything")
+    email = get_backend().auth.get_account_info(user["idToken"])["users"][0]["email"]
+    assert email not in get_backend().admin_emails
+
+
+def test_fetch_returns_templates_in_order(seeded):
+    from proposal_module import fetch_document_templates, fetch_index_templates
+
+    paths = fetch_document_templates(seeded.bucket, seeded.firestore_db, "Proposal")
+    assert [first_page_text(path) for path in paths] == ["Body 1", "Body 2", "Body 3"]
+
+    index_paths = fetch_index_templates(seeded.bucket, seeded.firestore_db, "Proposal")
+    assert [first_page_text(path) for path in index_paths] == ["Index 1", "Index 2"]
+
+
+def test_generate_fills_and_merges(seeded):
+    from document_types import DOCUMENT_DEFINITIONS
+    from proposal_module import build_pipeline
+    from template_metadata import get_template_metadata
+
+    metadata = get_template_metadata(seeded.firestore_db)
+    inputs = {"doc_type": "Proposal", "index_choice": 1, "preview_start": 0,
+              "templates_version": metadata.version("templates", "Proposal"),
+              "index_templates_version": metadata.version("index_templates", "Proposal"),
+              "fields": {"name": "Ann Lee", "email": "ann@example.com", "phone": "555 0100",
+                         "country": "Kenya", "date": date(2026, 5, 1)}}
+    context = {"bucket": seeded.bucket, "firestore_db": seeded.firestore_db}
+    result = build_pipeline(DOCUMENT_DEFINITIONS["Proposal"]).run("merge", inputs, {}, context)
+
+    assert result["errors"] == []
+    with fitz.open(stream=pdf_bytes(result["pdf"]), filetype="pdf") as doc:
+        texts = [page.get_text() for page in doc]
+    # Filled first template, the chosen index page, then the body from the third template on
+    assert len(texts) == 4
+    assert "Ann Lee" in texts[0] and "01 May 2026" in texts[0] and "14 April 2025" not in texts[0]
+    assert "Index 2" in texts[1]
+    assert "Body 3" in texts[2] and "Body 3" in texts[3]
+
+
+def test_failed_fill_is_recorded_and_not_memoized(seeded, monkeypatch):
+    import metrics
+    from cross_plat import EditTextFile
+    from document_types import DOCUMENT_DEFINITIONS
+    from proposal_module import build_pipeline
+
+    monkeypatch.setattr(EditTextFile, "modify_pdf_fields", lambda self, *args, **kwargs: None)
+    inputs = {"doc_type": "Proposal", "templates_version": 0,
+              "fields": {"name": "Ann Lee", "email": "ann@example.com", "phone": "555 0100",
+                         "country": "Kenya", "date": date(2026, 5, 1)}}
+    memo = {}
+    with pytest.raises(RuntimeError):
+        build_pipeline(DOCUMENT_DEFINITIONS["Proposal"]).run(
+            "fill", inputs, memo, {"bucket": seeded.bucket, "firestore_db": seeded.firestore_db})
+
+    assert "fill" not in memo
+    assert [span["ok"] for span in metrics.recent_spans() if span["stage"] == "fill"][-1] is False
+
+
+def test_local_backend_refused_with_firebase_secrets(monkeypatch):
+    set_backend(None)
+    monkeypatch.setattr(firebase_config, "BACKEND_NAME", "local")
+    monkeypatch.setattr(firebase_config, "firebase_secrets_present", lambda: True)
+    with pytest.raises(RuntimeError):
+        get_backend()
+
+    monkeypatch.setattr(firebase_config, "firebase_secrets_present", lambda: False)
+    assert isinstance(get_backend(), LocalBackend)
+    set_backend(None)
@@ -0,0 +1,27 @@
+import rasterizer
+from page_preview import BackgroundRenderer
+
+
+class FailingRasterizer:
+    def __init__(self):
+        self.calls = 0
+
+    def render(self, data, page_numbers, dpi, fmt):
+        self.calls += 1
+        raise RuntimeError("cannot render")
+
+
+def test_failed_render_is_forgotten_but_not_retried(monkeypatch):
+    failing = FailingRasterizer()
+    monkeypatch.setattr(rasterizer, "get_rasterizer", lambda: failing)
+    renderer = BackgroundRenderer(max_errors=2)
+
+    for doc_hash in ["a", "a", "b", "c"]:
+        renderer.submit(b"%PDF", doc_hash, [0], 36, "jpeg")
+        renderer._executor.submit(lambda: None).result()
+
+    # The running jobs are dropped with their data; only the last max_errors failures are kept
+    assert renderer._jobs == {}
+    assert list(renderer._errors) == [("b", 36, "jpeg", (0,)), ("c", 36, "jpeg", (0,))]
+    assert failing.calls == 3
+    assert not renderer.pending("a")
@@ -0,0 +1,40 @@
+from pipeline import Pipeline, Stage
+
+
+def counting_pipeline(calls, memoize_live=False):
+    def stage(name, func, **kwargs):
+        def run(**arguments):
+            calls.append(name)
+            return func(**arguments)
+        return Stage(name, run, **kwargs)
+
+    return Pipeline("test", [
+        stage("double", lambda value: value * 2, inputs=("value",)),
+        stage("live", lambda double: [double], inputs=("double",), memoize=memoize_live),
+        stage("total", lambda live: sum(live), inputs=("live",))
+    ])
+
+
+def test_unchanged_inputs_reuse_memoized_stages():
+    calls, memo = [], {}
+    pipeline = counting_pipeline(calls, memoize_live=True)
+    assert pipeline.run("total", {"value": 2}, memo) == 4
+    assert pipeline.run("total", {"value": 2}, memo) == 4
+    assert calls == ["double", "live", "total"]
+
+    assert pipeline.run("total", {"value": 3}, memo) == 6
+    assert calls[3:] == ["double", "live", "total"]
+
+
+def test_unmemoized_stages_rerun_and_stay_out_of_the_memo():
+    calls, memo = [], {}
+    pipeline = counting_pipeline(calls)
+    assert pipeline.run("total", {"value": 2}, memo) == 4
+    assert "live" not in memo
+    assert set(memo) == {"double", "total"}
+
+    # Downstream of an unmemoized stage is still keyed by its inputs
+    assert pipeline.run("total", {"value": 2}, memo) == 4
+    assert calls == ["double", "live", "total", "live"]
+    assert pipeline.run("live", {"value": 2}, memo) == [4]
+    assert "live" not in memo
@@ -0,0 +1,89 @@
+import pytest
+from google.api_core.exceptions import NotFound, ServiceUnavailable
+from local_backend import LocalBucket
+from storage_client import MULTIPART_MAX_BYTES, StorageClient, is_transient
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    return LocalBucket(str(tmp_path / "bucket"))
+
+
+def flaky(bucket, monkeypatch, failures):
+    # The first `failures` requests fail with the bucket's simulated ServiceUnavailable
+    calls = []
+    simulate_request = bucket.simulate_request
+
+    def counting():
+        calls.append(1)
+        bucket.failure_rate = 1.0 if len(calls) <= failures else 0.0
+        simulate_request()
+
+    monkeypatch.setattr(bucket, "simulate_request", counting)
+    return calls
+
+
+class RecordingBlob:
+    # Records the keyword arguments each upload was made with
+    def __init__(self, chunk_size=None):
+        self.name = "recorded.pdf"
+        self.chunk_size = chunk_size
+        self.uploads = []
+
+    def upload_from_string(self, data, content_type=None, **kwargs):
+        self.uploads.append(kwargs)
+
+
+def test_transient_errors_are_retried_until_the_call_succeeds(bucket, monkeypatch):
+    calls = flaky(bucket, monkeypatch, failures=2)
+    storage = StorageClient(bucket, retries=3, backoff=0)
+
+    storage.upload_bytes("a.pdf", b"%PDF")
+    assert storage.download_bytes("a.pdf") == b"%PDF"
+    assert len(calls) == 4
+
+
+def test_retries_give_up_after_the_limit(bucket, monkeypatch):
+    calls = flaky(bucket, monkeypatch, failures=10)
+    storage = StorageClient(bucket, retries=2, backoff=0)
+
+    with pytest.raises(ServiceUnavailable):
+        storage.upload_bytes("a.pdf", b"%PDF")
+    assert len(calls) == 3
+
+
+def test_non_transient_errors_are_not_retried(bucket, monkeypatch):
+    calls = flaky(bucket, monkeypatch, failures=0)
+    storage = StorageClient(bucket, retries=3, backoff=0)
+
+    with pytest.raises(NotFound):
+        storage.download_bytes("missing.pdf")
+    assert len(calls) == 1
+    # delete treats a missing blob as already deleted unless asked not to
+    storage.delete("missing.pdf")
+    with pytest.raises(NotFound):
+        storage.delete("missing.pdf", missing_ok=False)
+
+
+def test_is_transient():
+    assert is_transient(ServiceUnavailable("busy"))
+    assert is_transient(ConnectionError())
+    assert not is_transient(NotFound("gone"))
+    assert not is_transient(ValueError())
+
+
+def test_calls_carry_the_timeout_without_library_retries():
+    blob = RecordingBlob()
+    StorageClient(None, timeout=7).upload_bytes(blob, b"%PDF")
+    assert blob.uploads == [{"timeout": 7, "retry": None}]
+
+
+def test_only_uploads_above_the_multipart_limit_keep_library_retries():
+    small = RecordingBlob(chunk_size=256 * 1024)
+    large = RecordingBlob(chunk_size=256 * 1024)
+    storage = StorageClient(None, timeout=7)
+
+    storage.upload_bytes(small, b"x" * MULTIPART_MAX_BYTES)
+    storage.upload_bytes(large, b"x" * (MULTIPART_MAX_BYTES + 1))
+    assert small.uploads == [{"timeout": 7, "retry": None}]
+    assert large.uploads == [{"timeout": 7}]
@@ -0,0 +1,59 @@
+import os
+import time
+from local_backend import LocalBucket
+from template_cache import TemplateCache
+
+
+def fetch_all(cache, bucket, count):
+    paths = []
+    for number in range(count):
+        blob = bucket.blob(f"templates/t{number}.pdf")
+        blob.upload_from_string(b"%PDF-" + bytes([number]) * 1024)
+        paths.append(cache.fetch(bucket.blob(f"templates/t{number}.pdf")))
+    return paths
+
+
+def age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_eviction_removes_lock_files_with_their_entries(tmp_path):
+    bucket = LocalBucket(str(tmp_path / "bucket"))
+    cache = TemplateCache(str(tmp_path / "cache"), max_bytes=2500, min_age=60)
+    paths = fetch_all(cache, bucket, 3)
+    for path in paths:
+        age(path, 120)
+
+    cache.evict()
+    remaining = sorted(name for name in os.listdir(cache.cache_dir) if name != "evict.lock")
+    assert len([name for name in remaining if name.endswith(".pdf")]) == 2
+    assert sorted(name[:-5] for name in remaining if name.endswith(".lock")) == \
+        sorted(name[:-4] for name in remaining if name.endswith(".pdf"))
+
+
+def test_kept_paths_survive_eviction(tmp_path):
+    bucket = LocalBucket(str(tmp_path / "bucket"))
+    cache = TemplateCache(str(tmp_path / "cache"), max_bytes=1024, min_age=60)
+    paths = fetch_all(cache, bucket, 3)
+    for path in paths:
+        age(path, 120)
+
+    # A session still holding the oldest path touches it on its next rerun
+    cache.keep([paths[0]])
+    cache.evict()
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1]) and not os.path.exists(paths[2])
+
+
+def test_stale_orphan_locks_are_removed(tmp_path):
+    cache = TemplateCache(str(tmp_path / "cache"), min_age=60)
+    fresh = cache.lock_path("fresh")
+    stale = cache.lock_path("stale")
+    open(fresh, "w").close()
+    open(stale, "w").close()
+    age(stale, 120)
+
+    cache.evict()
+    assert os.path.exists(fresh)
+    assert not os.path.exists(stale)
@@ -0,0 +1,102 @@
+import time
+import pytest
+from local_backend import MemoryFirestore
+from template_metadata import TemplateMetadataCache
+
+
+@pytest.fixture
+def db():
+    db = MemoryFirestore()
+    db.collection("templates").document("a").set({"doc_type": "Proposal", "order": 1})
+    return db
+
+
+def names(cache):
+    return sorted(doc_id for doc_id, _ in cache.get("templates", "Proposal"))
+
+
+def test_listener_applies_adds_updates_and_removals(db):
+    cache = TemplateMetadataCache(db, mode="listen", ttl=60)
+    assert names(cache) == ["a"]
+    version = cache.version("templates", "Proposal")
+
+    db.collection("templates").document("b").set({"doc_type": "Proposal", "order": 2})
+    assert names(cache) == ["a", "b"]
+    assert cache.version("templates", "Proposal") == version + 1
+
+    db.collection("templates").document("a").update({"order": 5})
+    assert dict(cache.get("templates", "Proposal"))["a"]["order"] == 5
+
+    db.collection("templates").document("b").delete()
+    assert names(cache) == ["a"]
+    assert cache.version("templates", "Proposal") == version + 3
+
+    # Other document types do not touch the entry
+    db.collection("templates").document("c").set({"doc_type": "NDA"})
+    assert cache.version("templates", "Proposal") == version + 3
+    cache.close()
+
+
+def test_get_returns_private_copies(db):
+    cache = TemplateMetadataCache(db, mode="listen", ttl=60)
+    cache.get("templates", "Proposal")[0][1]["order"] = 99
+    assert dict(cache.get("templates", "Proposal"))["a"]["order"] == 1
+    cache.close()
+
+
+def test_stopped_listener_is_resubscribed(db):
+    cache = TemplateMetadataCache(db, mode="listen", ttl=60)
+    names(cache)
+    watch = cache._entries[("templates", "Proposal")].watch
+    watch.active = False
+
+    db.collection("templates").document("b").set({"doc_type": "Proposal"})
+    assert names(cache) == ["a", "b"]
+    assert cache._entries[("templates", "Proposal")].watch is not watch
+    cache.close()
+
+
+def test_silent_listener_is_caught_by_ttl_check(db):
+    cache = TemplateMetadataCache(db, mode="listen", ttl=0.05)
+    names(cache)
+    watch = cache._entries[("templates", "Proposal")].watch
+    # Still reports itself active but no longer receives changes
+    db.watches.remove(watch)
+
+    db.collection("templates").document("b").set({"doc_type": "Proposal"})
+    time.sleep(0.1)
+    assert names(cache) == ["a", "b"]
+
+    # The fresh listener delivers the next change without waiting for the TTL
+    cache.ttl = 60
+    db.collection("templates").document("c").set({"doc_type": "Proposal"})
+    assert names(cache) == ["a", "b", "c"]
+    cache.close()
+
+
+def test_invalidate_drops_listener_entries(db):
+    cache = TemplateMetadataCache(db, mode="listen", ttl=60)
+    names(cache)
+    version = cache.version("templates", "Proposal")
+    watch = cache._entries[("templates", "Proposal")].watch
+
+    cache.invalidate("templates", "Proposal")
+    assert not watch.is_active
+    assert names(cache) == ["a"]
+    # A recreated entry never reuses a version a session may have memoized
+    assert cache.version("templates", "Proposal") > version
+    cache.close()
+
+
+def test_poll_mode_reloads_after_ttl(db):
+    cache = TemplateMetadataCache(db, mode="poll", ttl=0.05)
+    assert names(cache) == ["a"]
+    db.collection("templates").document("b").set({"doc_type": "Proposal"})
+    assert names(cache) == ["a"]
+    time.sleep(0.1)
+    assert names(cache) == ["a", "b"]
+
+    db.collection("templates").document("c").set({"doc_type": "Proposal"})
+    cache.ttl = 60
+    cache.invalidate("templates")
+    assert names(cache) == ["a", "b", "c"]
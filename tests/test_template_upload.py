@@ -0,0 +1,52 @@
+import fitz
+import pytest
+from local_backend import LocalBucket, MemoryFirestore
+from template_upload import upload_template_file, upload_templates
+
+
+def pdf(text):
+    doc = fitz.open()
+    doc.new_page().insert_text((50, 100), text)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    import thumbnail_store
+    monkeypatch.setattr(thumbnail_store, "_thumbnail_store", thumbnail_store.ThumbnailStore(str(tmp_path / "thumbs")))
+    return LocalBucket(str(tmp_path / "bucket")), MemoryFirestore()
+
+
+def upload(store, pdfs):
+    bucket, db = store
+    return upload_templates(bucket, db, "templates", "pdf_templates/", "Proposal", pdfs, "admin@example.com", 1)
+
+
+def test_content_with_a_record_is_skipped(store):
+    data = pdf("A")
+    assert upload(store, [("a.pdf", data)])["uploaded"] == 1
+    report = upload(store, [("again.pdf", data), ("b.pdf", pdf("B"))])
+    assert [result["status"] for result in report["results"]] == ["skipped", "uploaded"]
+
+
+def test_orphan_blob_without_a_record_is_uploaded_again(store):
+    bucket, db = store
+    data = pdf("A")
+    bucket.blob("pdf_templates/Proposal/template_1.pdf").upload_from_string(data)
+
+    report = upload(store, [("a.pdf", data)])
+    assert report["uploaded"] == 1
+    # The orphan's name is not reused
+    [doc] = db.collection("templates").stream()
+    assert doc.to_dict()["filename"] != "Proposal/template_1.pdf"
+
+
+def test_single_file_upload_stores_blob_anchors_and_thumbnail(store):
+    bucket, db = store
+    record, warnings = upload_template_file(bucket, "pdf_templates/Proposal/template_1.pdf", pdf("Name:"), False)
+
+    assert warnings == []
+    assert bucket.blob("pdf_templates/Proposal/template_1.pdf").download_as_bytes().startswith(b"%PDF")
+    assert "anchors" in record and "thumbnail_generation" in record
@@ -0,0 +1,36 @@
+import os
+import time
+import template_cache
+import thumbnail_store
+from workspace import WorkspaceManager
+
+
+def write(path, size, age=0):
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    then = time.time() - age
+    os.utime(path, (then, then))
+
+
+def test_cleanup_removes_idle_workspaces_and_trims_shared_caches(tmp_path, monkeypatch):
+    thumbnails = thumbnail_store.ThumbnailStore(str(tmp_path / "thumbnails"), max_bytes=1500)
+    monkeypatch.setattr(thumbnail_store, "_thumbnail_store", thumbnails)
+    templates = template_cache.TemplateCache(str(tmp_path / "templates"), min_age=60)
+    monkeypatch.setattr(template_cache, "_template_cache", templates)
+
+    manager = WorkspaceManager(str(tmp_path / "workspaces"), ttl=60)
+    manager.get("live")
+    idle = manager.get("idle")
+    then = time.time() - 120
+    os.utime(idle.path, (then, then))
+
+    write(os.path.join(thumbnails.cache_dir, "old.png"), 1000, age=30)
+    write(os.path.join(thumbnails.cache_dir, "new.png"), 1000)
+    write(os.path.join(thumbnails.cache_dir, "new.png.1.2.part"), 10)
+    write(os.path.join(thumbnails.cache_dir, "old.png.1.2.part"), 10, age=2 * thumbnail_store.PART_FILE_AGE)
+    write(templates.lock_path("abandoned"), 0, age=120)
+
+    assert manager.cleanup() == ["idle"]
+    assert os.listdir(manager.root) == ["live"]
+    assert sorted(os.listdir(thumbnails.cache_dir)) == ["new.png", "new.png.1.2.part"]
+    assert not os.path.exists(templates.lock_path("abandoned"))
@@ -0,0 +1,169 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from cross_plat import open_pdf
+from template_cache import get_template_cache
+from storage_client import get_storage
+import metrics
+
+
+THUMBNAIL_DPI = 100
+THUMBNAIL_PREFIX = "thumbnails/"
+DEFAULT_CACHE_DIR = os.environ.get(
+    "THUMBNAIL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "proposal_thumbnail_cache")
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("THUMBNAIL_CACHE_MAX_MB", "64")) * 1024 * 1024
+# Leftovers of writes interrupted this long ago are removed
+PART_FILE_AGE = 60 * 60
+
+# How long a template blob's generation is trusted before it is checked again
+GENERATION_TTL = 60
+
+
+def render_thumbnail(pdf, dpi=THUMBNAIL_DPI):
+    doc = open_pdf(pdf)
+    try:
+        if doc.page_count == 0:
+            return None
+        with metrics.span("rasterize", pages=1, dpi=dpi):
+            return doc[0].get_pixmap(dpi=dpi).tobytes("png")
+    finally:
+        if doc is not pdf:
+            doc.close()
+
+
+def thumbnail_path(template_blob_name):
+    return f"{THUMBNAIL_PREFIX}{template_blob_name}.png"
+
+
+class ThumbnailStore:
+    # Thumbnails live next to the template in the bucket (thumbnails/<template path>.png)
+    # and in a local cache keyed by the template blob's generation, trimmed least recently read first.
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, generation_ttl=GENERATION_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.generation_ttl = generation_ttl
+        self.max_bytes = max_bytes
+        self._generations = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _cache_path(self, template_blob_name, generation):
+        key = hashlib.sha256(f"{template_blob_name}:{generation}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _read_cache(self, path):
+        try:
+            with open(path, "rb") as f:
+                thumbnail = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # mtime is the LRU timestamp, as in the template cache
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return thumbnail
+
+    def _write_cache(self, path, thumbnail):
+        part_path = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+        with open(part_path, "wb") as f:
+            f.write(thumbnail)
+        os.replace(part_path, path)
+
+    def evict(self):
+        # Thumbnails of superseded generations are never read again and age out here
+        entries = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+                if name.endswith(".part"):
+                    if now - stat.st_mtime > PART_FILE_AGE:
+                        os.unlink(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def generation(self, bucket, template_blob_name):
+        now = time.time()
+        with self._lock:
+            cached = self._generations.get(template_blob_name)
+        if cached and now - cached[1] < self.generation_ttl:
+            return cached[0]
+
+        with metrics.span("storage.metadata", blob=template_blob_name):
+            blob = get_storage(bucket).reload(template_blob_name)
+        with self._lock:
+            self._generations[template_blob_name] = (str(blob.generation), now)
+        return str(blob.generation)
+
+    def store(self, bucket, template_blob_name, generation, pdf):
+        # Renders and uploads a thumbnail; returns the fields to save on the template record
+        thumbnail = render_thumbnail(pdf)
+        if thumbnail is None:
+            return {}
+
+        path = thumbnail_path(template_blob_name)
+        with metrics.span("storage.upload", blob=path):
+            get_storage(bucket).upload_bytes(path, thumbnail, content_type="image/png")
+        self._write_cache(self._cache_path(template_blob_name, generation), thumbnail)
+
+        with self._lock:
+            self._generations[template_blob_name] = (str(generation), time.time())
+        return {"thumbnail_path": path, "thumbnail_generation": str(generation)}
+
+    def get(self, bucket, template_blob_name, record=None, on_regenerated=None):
+        # Returns PNG bytes (None for an empty PDF). on_regenerated receives the new record
+        # fields whenever the stored thumbnail was missing or older than the template.
+        record = record or {}
+        generation = self.generation(bucket, template_blob_name)
+        cache_path = self._cache_path(template_blob_name, generation)
+
+        thumbnail = self._read_cache(cache_path)
+        if thumbnail is not None:
+            return thumbnail
+
+        if record.get("thumbnail_path") and record.get("thumbnail_generation") == generation:
+            try:
+                with metrics.span("storage.download", blob=record["thumbnail_path"]):
+                    thumbnail = get_storage(bucket).download_bytes(record["thumbnail_path"])
+                self._write_cache(cache_path, thumbnail)
+                return thumbnail
+            except Exception as e:
+                print(f"Stored thumbnail unavailable for {template_blob_name}, regenerating: {e}")
+
+        template_blob = bucket.blob(template_blob_name)
+        template_path = get_template_cache().fetch(template_blob)
+        # The fetch reloads metadata, so key the new thumbnail by the generation actually rendered
+        generation = str(template_blob.generation)
+        fields = self.store(bucket, template_blob_name, generation, template_path)
+        if fields and on_regenerated:
+            on_regenerated(fields)
+        return self._read_cache(self._cache_path(template_blob_name, generation))
+
+
+_thumbnail_store = None
+_thumbnail_store_lock = threading.Lock()
+
+
+def get_thumbnail_store():
+    global _thumbnail_store
+    with _thumbnail_store_lock:
+        if _thumbnail_store is None:
+            _thumbnail_store = ThumbnailStore()
+        return _thumbnail_store
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+
+DEFAULT_ROOT = os.environ.get("WORKSPACE_DIR", os.path.join(tempfile.gettempdir(), "proposal_workspaces"))
+SESSION_QUOTA_BYTES = int(os.environ.get("WORKSPACE_QUOTA_MB", "200")) * 1024 * 1024
+# A workspace not touched for this long belongs to an abandoned session
+SESSION_TTL = int(os.environ.get("WORKSPACE_TTL", "3600"))
+CLEANUP_INTERVAL = 300
+
+
+class WorkspaceQuotaExceeded(Exception):
+    pass
+
+
+class SessionWorkspace:
+    # A directory owned by one session. The directory mtime is the session's heartbeat.
+    def __init__(self, manager, session_id):
+        self.manager = manager
+        self.session_id = session_id
+        self.path = os.path.join(manager.root, session_id)
+
+    def touch(self):
+        os.makedirs(self.path, exist_ok=True)
+        os.utime(self.path)
+
+    def usage(self):
+        total = 0
+        for dir_path, _, filenames in os.walk(self.path):
+            for filename in filenames:
+                try:
+                    total += os.path.getsize(os.path.join(dir_path, filename))
+                except FileNotFoundError:
+                    pass
+        return total
+
+    def check_quota(self, extra_bytes):
+        if self.usage() + extra_bytes > self.manager.quota_bytes:
+            raise WorkspaceQuotaExceeded(
+                f"Session workspace quota of {self.manager.quota_bytes // (1024 * 1024)} MB exceeded"
+            )
+
+    def scratch_dir(self, prefix="scratch_"):
+        # Caller removes it; anything left behind goes with the workspace
+        self.touch()
+        return tempfile.mkdtemp(prefix=prefix, dir=self.path)
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class WorkspaceManager:
+    def __init__(self, root=DEFAULT_ROOT, quota_bytes=SESSION_QUOTA_BYTES, ttl=SESSION_TTL,
+                 cleanup_interval=CLEANUP_INTERVAL):
+        self.root = root
+        self.quota_bytes = quota_bytes
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def get(self, session_id):
+        # Marks the session as alive and sweeps abandoned ones every cleanup_interval seconds
+        workspace = SessionWorkspace(self, session_id)
+        workspace.touch()
+        self.maybe_cleanup()
+        return workspace
+
+    def maybe_cleanup(self):
+        with self._lock:
+            if time.time() - self._last_cleanup < self.cleanup_interval:
+                return []
+            self._last_cleanup = time.time()
+        return self.cleanup()
+
+    def cleanup(self):
+        # Removes workspaces idle for longer than the TTL; safe to run from several processes
+        removed = []
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                idle = now - os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if idle > self.ttl and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                removed.append(name)
+
+        if removed:
+            print(f"Removed {len(removed)} abandoned session workspace(s)")
+
+        # The shared caches are bounded separately; this keeps them trimmed between writes
+        from template_cache import get_template_cache
+        from thumbnail_store import get_thumbnail_store
+        get_template_cache().evict()
+        get_thumbnail_store().evict()
+        return removed
+
+
+_workspace_manager = None
+_workspace_manager_lock = threading.Lock()
+
+
+def get_workspace_manager():
+    global _workspace_manager
+    with _workspace_manager_lock:
+        if _workspace_manager is None:
+            _workspace_manager = WorkspaceManager()
+        return _workspace_manager